@@ -39,7 +39,7 @@ def assistant(console, data) -> None:
             data.model["model_title"], data.model["model_name"], user_input, "", False, []
         )
         match handled_user_input:
-            case "continue" | None:
+            case "continue" | "switched" | None:
                 continue
             case "break":
                 break
@@ -0,0 +1,123 @@
+import base64
+import hashlib
+import os
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from console_gpt.config_manager import BASE_PATH
+
+"""
+Attachment store - images kept once on disk by the hash of their content
+Messages only hold a reference part ({"type": "image_ref", ...}), the base64 payload is built when a request is sent.
+So the conversation, the saved chats and the response cache keys stay small and an image used in several chats is
+stored once.
+"""
+
+ATTACHMENTS_PATH = os.path.join(BASE_PATH, "app-data", "attachments")
+REF_TYPE = "image_ref"
+
+
+def _attachment_path(digest: str) -> str:
+    return os.path.join(ATTACHMENTS_PATH, digest[:2], digest)
+
+
+def attachment_exists(digest: str) -> bool:
+    """:return: True if the image with this hash is in the store"""
+    return os.path.exists(_attachment_path(digest))
+
+
+def store_image(data: bytes, media_type: str) -> Dict[str, str]:
+    """
+    Keep an image in the store (once, no matter how often it's added)
+    :param data: The image file
+    :param media_type: Its MIME type (E.g. image/png)
+    :return: The reference part for the content of a message
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    path = _attachment_path(digest)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return {"type": REF_TYPE, "sha256": digest, "media_type": media_type}
+
+
+def _is_ref(part: Any) -> bool:
+    return isinstance(part, dict) and part.get("type") == REF_TYPE
+
+
+@lru_cache(maxsize=8)
+def _base64(digest: str) -> str:
+    """Supporting function for materialize(), the payload of a stored image (the latest ones are kept encoded)."""
+    with open(_attachment_path(digest), "rb") as f:
+        return base64.b64encode(f.read()).decode("utf-8")
+
+
+def _image_part(part: Dict[str, str], anthropic: bool) -> Dict[str, Any]:
+    """
+    Supporting function for materialize()
+    :param part: A reference part
+    :param anthropic: Build the image part of Anthropic instead of the OpenAI one
+    :return: The image part with the base64 payload
+    """
+    data = _base64(part["sha256"])
+    if anthropic:
+        return {"type": "image", "source": {"type": "base64", "media_type": part["media_type"], "data": data}}
+    return {"type": "image_url", "image_url": {"url": f"data:{part['media_type']};base64,{data}"}}
+
+
+def materialize(messages: List[Dict[str, Any]], anthropic: bool) -> List[Dict[str, Any]]:
+    """
+    Replace the image references of the messages with the images, as expected by the provider
+    :param messages: The messages of a request
+    :param anthropic: The request goes to an Anthropic model
+    :return: The messages (only the ones with references are copied)
+    :raises FileNotFoundError: If a referenced image was removed from the store
+    """
+    materialized = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, (list, tuple)) and any(_is_ref(part) for part in content):
+            parts = [_image_part(part, anthropic) if _is_ref(part) else part for part in content]
+            message = {**message, "content": parts}
+        materialized.append(message)
+    return materialized
+
+
+def _inline_image(part: Any) -> Optional[Dict[str, str]]:
+    """
+    Supporting function for externalize()
+    :param part: A content part
+    :return: The reference of an inline base64 image part, None for any other part
+    """
+    if not isinstance(part, dict):
+        return None
+    if part.get("type") == "image" and part.get("source", {}).get("type") == "base64":
+        media_type, data = part["source"].get("media_type", "image/jpeg"), part["source"].get("data", "")
+    elif part.get("type") == "image_url" and part.get("image_url", {}).get("url", "").startswith("data:"):
+        header, _, data = part["image_url"]["url"].partition(",")
+        media_type = header.removeprefix("data:").split(";")[0] or "image/jpeg"
+    else:
+        return None
+    try:
+        return store_image(base64.b64decode(data, validate=True), media_type)
+    except (ValueError, OSError):
+        return None  # Kept inline
+
+
+def externalize(conversation: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Move the inline base64 images of a chat (saved before the attachment store) into the store
+    :param conversation: The conversation, changed in place
+    :return: The conversation
+    """
+    for message in conversation:
+        content = message.get("content") if isinstance(message, dict) else None
+        if not isinstance(content, (list, tuple)):
+            continue
+        refs = [_inline_image(part) for part in content]
+        if any(refs):
+            message["content"] = [ref or part for ref, part in zip(refs, content)]
+    return conversation
@@ -0,0 +1,274 @@
+import copy
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+from console_gpt.catch_errors import is_transient
+from console_gpt.chat_engine import new_client
+from console_gpt.config_manager import fetch_variable
+from console_gpt.cost_tracker import Usage, new_chat_id, record_usage, usage_from_response
+from console_gpt.custom_stdout import custom_print
+from console_gpt.menus.ai_managed import update_api_key_if_placeholder
+from console_gpt.ollama_helper import is_ollama_running, start_ollama
+from console_gpt.response_cache import ResponseCache, is_cacheable, request_key
+from console_gpt.token_counter import TokenCounter
+
+"""
+Headless batch mode - run a JSONL file of chat requests concurrently
+"""
+
+# Provider of a model, guessed from its key in [chat.models] (same keywords as helpers/get_models.py)
+# Local Ollama models come first, their names may contain the keywords of the other providers
+PROVIDER_KEYWORDS = {
+    "ollama": ("ollama:",),
+    "anthropic": ("anthropic",),
+    "mistral": ("mistral", "pixtral"),
+    "openai": ("gpt", "o1", "o3"),
+    "grok": ("grok",),
+    "gemini": ("gemini",),
+    "deepseek": ("deepseek",),
+    "alibaba": ("qwen", "qwq"),
+    "inception": ("mercury",),
+}
+
+# Models served by Ollama are requested as "ollama:<local model name>"
+OLLAMA_PREFIX = "ollama:"
+
+
+class RateLimiter:
+    """Spaces out the requests sent to a single provider, so at most `per_minute` of them start per minute."""
+
+    def __init__(self, per_minute: float) -> None:
+        self.interval = 60 / per_minute if per_minute else 0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        """Block until the next free slot (returns at once if the provider isn't limited)."""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        time.sleep(slot - now)
+
+
+def _provider_of(model_key: str) -> str:
+    """
+    Supporting function for _run_request()
+    :param model_key: Key of the model in [chat.models]
+    :return: Name of the provider (or "other")
+    """
+    return next(
+        (provider for provider, words in PROVIDER_KEYWORDS.items() if any(word in model_key for word in words)),
+        "other",
+    )
+
+
+def _resolve_models(requests: List[Dict[str, Any]]) -> Dict[str, Dict]:
+    """
+    Supporting function for run_batch(), the data of every model used by the requests.
+    Missing API keys are asked for here, before any request runs.
+    :param requests: The batch requests
+    :return: The model data (incl. model_title) by the model key of the requests
+    """
+    configured = fetch_variable("models")
+    models = {}
+    used = {
+        request.get("model") or fetch_variable("defaults", "model") for request in requests if "_error" not in request
+    }
+    for model_key in used:
+        if not isinstance(model_key, str):
+            continue
+        if model_key.startswith(OLLAMA_PREFIX):
+            # The same data as the model menu uses for a locally hosted model
+            models[model_key] = {
+                "api_key": "ollama",
+                "model_input_pricing_per_1k": 0,
+                "model_max_tokens": 0,
+                "model_name": model_key[len(OLLAMA_PREFIX) :],
+                "model_output_pricing_per_1k": 0,
+                "model_title": "ollama",
+            }
+        elif model_key in configured:
+            models[model_key] = update_api_key_if_placeholder({**configured[model_key], "model_title": model_key})
+    if any(model_key.startswith(OLLAMA_PREFIX) for model_key in models) and not is_ollama_running():
+        start_ollama()
+    return models
+
+
+def _read_requests(input_path: str) -> List[Dict[str, Any]]:
+    """
+    Read the batch input, one JSON request per line (blank lines are skipped)
+    :param input_path: Path to the JSONL file
+    :return: The requests, a line which isn't valid JSON is kept as {"_error": <reason>}
+    """
+    requests = []
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("a request must be a JSON object")
+            except ValueError as e:
+                request = {"_error": f"Invalid request on line {line_number}: {e}"}
+            requests.append(request)
+    return requests
+
+
+def _record_cost(run_id: str, model_key: str, model: Dict, messages: List[Dict], response: Any, latency: float) -> None:
+    """
+    Supporting function for _run_request(), adds the request to the cost ledger (estimated if the usage is missing)
+    :param run_id: Id of the batch run in the ledger
+    :param model_key: Key of the model in [chat.models]
+    :param model: The model data
+    :param messages: The messages of the request
+    :param response: Non-streamed chat completion
+    :param latency: Seconds the request took
+    """
+    usage = usage_from_response(getattr(response, "usage", None))
+    if usage is None:
+        counter = TokenCounter(model["model_name"])
+        content = response.choices[0].message.content or ""
+        usage = Usage(counter.count(messages), counter.count_text(content), estimated=True)
+    record_usage(run_id, {**model, "model_title": model_key}, usage, latency)
+
+
+def _run_request(
+    index: int, request: Dict[str, Any], models: Dict[str, Dict], limiters: Dict[str, RateLimiter], run_id: str
+) -> Dict[str, Any]:
+    """
+    Run a single request, retried on connection errors, rate limits and server errors, never raises
+    :param index: Position of the request in the input file
+    :param request: {"model": <key in [chat.models] or ollama:<name>>, "messages": [...], "temperature": <optional>, "id": <optional>,
+    "cache": <optional, reuse the reply of an identical request whatever the temperature>}
+    :param models: The models used by the requests (see _resolve_models())
+    :param limiters: Rate limiter of each provider
+    :param run_id: Id of the batch run in the cost ledger
+    :return: The result line for the output file
+    """
+    result = {"index": index, "id": request.get("id"), "model": request.get("model"), "status": "error"}
+    if "_error" in request:
+        return {**result, "error": request["_error"], "attempts": 0}
+
+    model_key = request.get("model") or fetch_variable("defaults", "model")
+    model = models.get(model_key)
+    messages = request.get("messages")
+    if model is None:
+        return {**result, "model": model_key, "error": f"Unknown model '{model_key}'", "attempts": 0}
+    if not isinstance(messages, list) or not messages:
+        return {**result, "model": model_key, "error": "'messages' must be a non-empty list", "attempts": 0}
+
+    temperature = request.get("temperature", fetch_variable("defaults", "temperature"))
+    max_retries = fetch_variable("batch", "max_retries", default=5)
+    backoff = fetch_variable("batch", "retry_backoff", default=2)
+    limiter = limiters[_provider_of(model_key)]
+
+    params = {"model": model["model_name"], "messages": messages, "temperature": temperature}
+    cache_key = request_key(params) if is_cacheable(params, opt_in=bool(request.get("cache"))) else None
+    if cache_key and (entry := ResponseCache.shared().get(cache_key)):
+        return {
+            **result,
+            "model": model_key,
+            "status": "success",
+            "content": entry.get("content"),
+            "usage": None,
+            "attempts": 0,
+            "latency": 0,
+            "cached": True,
+        }
+
+    error = ""
+    for attempt in range(1, max_retries + 2):
+        limiter.wait()
+        started = time.monotonic()
+        try:
+            # The client keeps state of its conversation, so every request gets its own
+            client = new_client(model)
+            response = client.chat.completions.create(
+                model=model["model_name"],
+                messages=copy.deepcopy(messages),
+                temperature=temperature,
+                stream=False,
+            )
+            latency = time.monotonic() - started
+            _record_cost(run_id, model_key, model, messages, response, latency)
+            usage = usage_from_response(getattr(response, "usage", None))
+            if cache_key:
+                ResponseCache.shared().put(
+                    cache_key,
+                    {
+                        "content": response.choices[0].message.content or "",
+                        "reasoning": getattr(response.choices[0].message, "reasoning_content", None) or "",
+                        "tool_calls": [],
+                        "usage": usage._asdict() if usage else None,
+                    },
+                )
+            return {
+                **result,
+                "model": model_key,
+                "status": "success",
+                "content": response.choices[0].message.content,
+                "usage": usage._asdict() if usage else None,
+                "attempts": attempt,
+                "latency": round(latency, 3),
+            }
+        except Exception as e:
+            error = str(e)
+            if attempt > max_retries or not is_transient(e):
+                break
+            # Exponential backoff with jitter, so throttled requests don't retry in lockstep
+            time.sleep(backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+
+    return {**result, "model": model_key, "error": error, "attempts": attempt}
+
+
+def run_batch(input_path: str, output_path: str, concurrency: Optional[int] = None) -> None:
+    """
+    Run every request of a JSONL file through the configured models without any interaction.
+    Results are written as soon as they complete, each one carries the index of its request to restore the input order.
+    :param input_path: JSONL file with one request per line
+    :param output_path: JSONL file for the results (overwritten)
+    :param concurrency: Requests running at the same time, defaults to batch.max_concurrency
+    :return: Nothing
+    """
+    requests = _read_requests(input_path)
+    models = _resolve_models(requests)
+    limits = fetch_variable("batch", "requests_per_minute", default={})
+    limiters = {provider: RateLimiter(limits.get(provider, 0)) for provider in [*PROVIDER_KEYWORDS, "other"]}
+    concurrency = concurrency or fetch_variable("batch", "max_concurrency", default=8)
+    run_id = new_chat_id("batch")
+
+    custom_print("info", f"Running {len(requests)} requests ({concurrency} at a time)...")
+    started = time.monotonic()
+    completed = failed = 0
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch")
+    try:
+        with open(output_path, "w", encoding="utf-8") as out:
+            futures = [
+                pool.submit(_run_request, index, request, models, limiters, run_id)
+                for index, request in enumerate(requests)
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+                completed += 1
+                if result["status"] == "error":
+                    failed += 1
+                    custom_print("error", f"Request {result['index']} failed: {result['error']}")
+    except KeyboardInterrupt:
+        custom_print("warn", f"Interrupted - {len(requests) - completed} requests were not run.")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    custom_print(
+        "ok",
+        f"Completed {completed} requests ({failed} failed) in {time.monotonic() - started:.1f}s - {output_path}",
+    )
@@ -0,0 +1,54 @@
+from typing import Any, Dict, List, Tuple, Union
+
+from console_gpt.config_manager import fetch_variable
+
+"""
+Anthropic prompt cache planning - decides which content goes behind a cache breakpoint
+
+unichat places the breakpoints of a request itself: the tools, the `cached` system block and the last two
+user messages (the rolling conversation prefix), which is the limit of four per request. The planner fills
+the `cached` system block with the large attachments (files, web pages, multiline inputs) of the chat, so
+they are read from the cache on the following turns (the block is written anew whenever an attachment is added).
+"""
+
+# The raw content of an attachment, kept next to the text of the user message
+ATTACHMENT_KEY = "_cache_attachment"
+
+
+def inline_attachment(message: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    :param message: A user message
+    :return: The message with its attachment (if any) as part of the text, like without caching
+    """
+    if ATTACHMENT_KEY not in message:
+        return message
+    return {**message, "content": f"{message['content']}:\n{message[ATTACHMENT_KEY]}"}
+
+
+def plan_cache(
+    messages: List[Dict[str, Any]], counter: Any, enabled: bool
+) -> Tuple[List[Dict[str, Any]], Union[bool, str]]:
+    """
+    Move the attachments large enough to be cached into the cached system block.
+    unichat sends the block as a single text with one breakpoint, so a new attachment changes it and the block is
+    written to the cache again once (the tools before it stay cached), then it's read from the cache until the next one.
+    :param messages: The messages of the request
+    :param counter: TokenCounter of the model (it keeps the token count of every attachment)
+    :param enabled: Prompt caching is supported (Anthropic models with a system prompt)
+    :return: The messages to send and the `cached` argument for unichat (False if nothing is cached)
+    """
+    if not enabled:
+        return [inline_attachment(message) for message in messages], False
+
+    min_tokens = fetch_variable("cache", "min_tokens", default=1024)
+    planned, blocks = [], []
+    for message in messages:
+        attachment = message.get(ATTACHMENT_KEY)
+        if attachment is None or counter.count_attachment(message) < min_tokens:
+            planned.append(inline_attachment(message))
+            continue
+        blocks.append(f'<attachment id="{len(blocks) + 1}">\n{attachment}\n</attachment>')
+        planned.append(
+            {**message, "content": f"{message['content']}\n\n(See attachment {len(blocks)} in the system prompt.)"}
+        )
+    return planned, "\n\n".join(blocks) if blocks else False
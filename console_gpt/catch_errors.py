@@ -1,5 +1,19 @@
+from unichat.api_helper import anthropic, openai
+
 from console_gpt.custom_stdout import custom_print
 
+# Failures which may pass when the request is sent again (the provider couldn't be reached, timed out or is busy)
+TRANSIENT_ERRORS = (
+    ConnectionError,
+    TimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+    anthropic.APIConnectionError,
+    anthropic.RateLimitError,
+    anthropic.InternalServerError,
+)
+
 
 def sigint_wrapper(func):
     """
@@ -41,13 +55,17 @@ def eof_wrapper(func):
     return inner
 
 
-def handle_with_exceptions(action):
-    try:
-        response = action()
-        return response
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        return "error_appeared"
-    except KeyboardInterrupt:
-        custom_print("info", "Interrupted the request. Continue normally.")
-        return "interrupted"
+def is_transient(error: BaseException) -> bool:
+    """
+    Tell if a failed request is worth retrying, unlike E.g. an invalid key, model or request
+    :param error: The raised exception, the errors it was raised from are checked as well (unichat wraps the SDK ones)
+    :return: True for connection errors, timeouts, rate limits (429) and server errors (5xx)
+    """
+    while error is not None:
+        if isinstance(error, TRANSIENT_ERRORS):
+            return True
+        status_code = getattr(error, "status_code", None)
+        if isinstance(status_code, int) and (status_code in (408, 429) or status_code >= 500):
+            return True
+        error = error.__cause__
+    return False
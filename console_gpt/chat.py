@@ -1,61 +1,55 @@
-from unichat import UnifiedChatApi
-from unichat.api_helper import openai
+import asyncio
 
-from console_gpt.catch_errors import handle_with_exceptions
+from console_gpt.cache_planner import ATTACHMENT_KEY
+from console_gpt.chat_engine import ChatEngine
+from console_gpt.chat_journal import ChatJournal
 from console_gpt.config_manager import fetch_variable
 from console_gpt.custom_stdout import custom_print
 from console_gpt.menus.command_handler import command_handler
 from console_gpt.ollama_helper import start_ollama
 from console_gpt.prompts.save_chat_prompt import save_chat
 from console_gpt.prompts.user_prompt import chat_user_prompt
-from console_gpt.unichat_handler import (handle_non_streaming_response,
-                                         handle_streaming_response)
+from console_gpt.token_counter import print_context_usage
+from console_gpt.unichat_handler import render_reply
 from mcp_servers.mcp_tcp_client import MCPClient
 from mcp_servers.server_manager import ServerManager
 
 
 def chat(console, data, managed_user_prompt) -> None:
-    # Assign all variables at once via the Object returned by the menu
-    (
-        api_key,
-        model_input_pricing_per_1k,
-        model_max_tokens,
-        model_name,
-        model_output_pricing_per_1k,
-        model_title,
-    ) = data.model.values()
+    # Read by key, a model may have optional settings (E.g. model_context_tokens)
+    model_name, model_title = data.model["model_name"], data.model["model_title"]
 
-    client = (
-        openai.OpenAI(base_url="http://localhost:11434/v1", api_key=api_key)
-        if model_title == "ollama"
-        else UnifiedChatApi(api_key=api_key)
-    )
     conversation = data.conversation
     temperature = data.temperature
     cached = model_title.startswith("anthropic")
     tools = []
     if fetch_variable("features", "mcp_client"):
         try:
-            with MCPClient() as mcp:
-                if mcp is None:
-                    custom_print(
-                        "error", "Could not establish connection to MCP server. Chat functionality may be limited."
-                    )
-                else:
-                    tools = mcp.get_available_tools()
-                    custom_print("info", f"Total tools initialized: {len(tools)}", start="\n")
+            mcp = MCPClient.session()
+            if mcp is None:
+                custom_print(
+                    "error", "Could not establish connection to MCP server. Chat functionality may be limited."
+                )
+            else:
+                tools = mcp.get_available_tools()
+                custom_print("info", f"Total tools initialized: {len(tools)}", start="\n")
         except KeyboardInterrupt:
             ready = False
+            MCPClient.close_session()
             while not ready:
                 _, message = ServerManager().stop_server()
                 if message in ["Server stopped successfully", "Server force stopped"]:
                     ready = True
             custom_print("exit", "Goodbye, see you soon!", 130)
 
+    engine = ChatEngine(data.model, conversation, temperature)
+    ChatJournal.start(conversation, model_title)
+
     # Inner Loop
     while True:
-        response = ""  # Adding this to satisfy the IDE
-        error_appeared = False  # Used when the API returns an exception
+        # Written after every turn (and after every change of it E.g. a removed message or a switched chat)
+        ChatJournal.sync_active(conversation)
+        resume = False  # Continue the interrupted last reply instead of sending a new message
         # Check if we're not in the middle of a tool call
         if (
             not conversation
@@ -87,60 +81,62 @@ def chat(console, data, managed_user_prompt) -> None:
                     continue
                 case "continue" | None:
                     continue
+                case "switched":
+                    # A new engine (and API client), so nothing of the previous chat is kept by the provider client
+                    engine = ChatEngine(data.model, conversation, temperature)
+                    continue
                 case "break":
                     break
+                case "resume":
+                    resume = True
+                case (str() as text, str() as attachment):
+                    # Large inputs are kept apart, so they can be placed in the prompt cache
+                    user_input["content"], user_input[ATTACHMENT_KEY] = text, attachment
                 case _:
-                    if model_title.startswith("anthropic") and cached is True:
-                        user_input["content"], cached = handled_user_input
-                    else:
-                        user_input["content"] = handled_user_input
+                    user_input["content"] = handled_user_input
 
             # Add user's input to the overall conversation
-            conversation.append(user_input)
-
-        # Get chat completion
-        streaming = fetch_variable("features", "streaming")
-        # Start the loading bar until API response is returned
-        with console.status("[bold green]Generating a response...", spinner="aesthetic"):
-            params = {
-                "model": model_name,
-                "messages": conversation,
-                "temperature": temperature,
-                "tools": tools,
-                "stream": streaming,
-            }
-            if cached is not False:
-                params["cached"] = cached
-            if model_title == "anthropic-sonnet-latest-thinking":
-                params["thinking"] = True
-
-            response = handle_with_exceptions(lambda: client.chat.completions.create(**params))
-
-        if response not in ["interrupted", "error_appeared"] and streaming:
-            conversation = handle_with_exceptions(lambda: handle_streaming_response(model_name, response, conversation))
+            if not resume:
+                conversation.append(user_input)
+                ChatJournal.sync_active(conversation)
 
-        if response not in ["interrupted", "error_appeared"] and not streaming:
-            conversation = handle_non_streaming_response(model_name, response, conversation)
-        elif response == "interrupted":
+        # Get chat completion (including the tool calls in between)
+        engine.tools = tools
+        engine.cached = cached
+        try:
+            error = asyncio.run(render_reply(console, engine, fetch_variable("features", "streaming"), resume))
+        except KeyboardInterrupt:
+            if engine.can_resume():
+                custom_print("info", "Interrupted the reply. Type `continue` to resume it or continue normally.")
+                continue
+            custom_print("info", "Interrupted the request. Continue normally.")
             last_user_index = next((i for i, msg in enumerate(reversed(conversation)) if msg["role"] == "user"), None)
 
             if last_user_index is not None:
-                conversation = conversation[: len(conversation) - 1 - last_user_index]
+                del conversation[len(conversation) - 1 - last_user_index :]
             continue
-        elif response == "error_appeared":
-            error_appeared = True
 
-        if error_appeared:
-            if model_title == "ollama":
-                custom_print("warn", "Restarting Ollama Server...")
-                start_ollama()
-                custom_print("info", "Note that your last message was lost.")
-            else:
-                custom_print(
-                    "warn",
-                    "Exception was raised. Decided whether to continue. Your last message is lost as well",
-                )
-            # Removes the last user input in order to avoid issues if the conversation continues
-            if conversation:
-                conversation.pop(-1)
+        if error is None:
+            if fetch_variable("context", "show_budget", default=True):
+                print_context_usage(engine.context_usage())
+            continue
+
+        custom_print("error", f"An error occurred: {error}")
+        if model_title == "ollama":
+            custom_print("warn", "Restarting Ollama Server...")
+            start_ollama()
+        if resume:
+            # The engine put the interrupted reply back, so it can still be resumed
+            custom_print("warn", "Could not resume the reply. Type `continue` to try again or continue normally.")
             continue
+        if model_title == "ollama":
+            custom_print("info", "Note that your last message was lost.")
+        else:
+            custom_print(
+                "warn",
+                "Exception was raised. Decided whether to continue. Your last message is lost as well",
+            )
+        # Removes the last user input in order to avoid issues if the conversation continues
+        if conversation:
+            conversation.pop(-1)
+        continue
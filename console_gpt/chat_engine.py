@@ -0,0 +1,521 @@
+import asyncio
+import inspect
+import json
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+from unichat import UnifiedChatApi
+from unichat.api_helper import openai
+
+from console_gpt.attachment_store import materialize
+from console_gpt.cache_planner import plan_cache
+from console_gpt.catch_errors import is_transient
+from console_gpt.compaction import apply_summary, compaction_span, is_active, summarize
+from console_gpt.config_manager import fetch_variable
+from console_gpt.cost_tracker import Usage, new_chat_id, record_usage, usage_from_response
+from console_gpt.response_cache import ResponseCache, is_cacheable, request_key
+from console_gpt.token_counter import MESSAGE_OVERHEAD, ContextUsage, TokenCounter, fit_to_budget
+from console_gpt.tool_executor import ToolCall, execute_tool_calls
+
+"""
+Conversation logic (message assembly, the tool-call loop and retries) without any terminal I/O
+"""
+
+# Seconds to wait before each retry of a request which failed on a transient error (see catch_errors.is_transient())
+RETRY_DELAYS = (1, 3)
+
+# Sent (but never stored) to resume a reply which was interrupted
+CONTINUE_PROMPT = (
+    "Your previous answer was cut off. Continue it exactly where it stopped, without repeating anything "
+    "and without any introduction."
+)
+
+
+class ChatEvent(NamedTuple):
+    """
+    Something that happened while getting a reply, kinds and their data:
+    reply_start (None) - the model started answering, one per API response
+    reasoning (str) - reasoning text, a delta while streaming
+    content (str) - answer text, a delta while streaming
+    reply_end (dict) - the assistant message, already added to the conversation
+    (a cancelled stream adds what arrived so far instead, marked with "_truncated")
+    tool_calls (List[ToolCall]) - the tools requested by the model, about to be executed
+    tool_results (List[dict]) - the tool messages, already added to the conversation
+    compacted (dict) - older turns were replaced by this summary message, already added to the conversation
+    notice (str) - something went wrong which doesn't stop the reply
+    error (Exception) - the request failed, the conversation is back to how it was before
+    """
+
+    kind: str
+    data: Any = None
+
+
+_DONE = object()
+
+
+def prepare_messages(conversation: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Copy of the conversation as sent to the provider.
+    Keys starting with an underscore are local bookkeeping (E.g. "_truncated") and are rejected by some providers.
+    :param conversation: The conversation
+    :return: The messages without the private keys
+    """
+    return [{key: value for key, value in message.items() if not key.startswith("_")} for message in conversation]
+
+
+def new_client(model: Dict[str, Any]) -> Any:
+    """
+    :param model: The model data (api_key, model_title)
+    :return: API client for the model, Ollama models are served locally through their OpenAI compatible API
+    """
+    if model["model_title"] == "ollama":
+        return openai.OpenAI(base_url="http://localhost:11434/v1", api_key=model["api_key"])
+    return UnifiedChatApi(api_key=model["api_key"])
+
+
+def _tool_use_ids(message: Dict[str, Any]) -> Tuple[str, ...]:
+    """
+    :param message: A message in the Anthropic format
+    :return: The ids of the tools called by an assistant message
+    """
+    content = message.get("content")
+    if message.get("role") != "assistant" or not isinstance(content, list):
+        return ()
+    return tuple(block.get("id") for block in content if isinstance(block, dict) and block.get("type") == "tool_use")
+
+
+def anthropic_history(messages: List[Dict[str, Any]], previous: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    The messages of a request in the Anthropic format (without the system messages).
+    Consecutive tool messages become one user message, as Anthropic expects every result of a turn together.
+    Assistant tool calls which unichat already holds are taken from there, so their signed thinking blocks are kept.
+    :param messages: The messages of the request
+    :param previous: The Anthropic conversation unichat holds from the earlier requests
+    :return: The Anthropic messages
+    """
+    answered = {_tool_use_ids(message): message for message in previous if _tool_use_ids(message)}
+    history = []
+    for message in messages:
+        role = message.get("role")
+        if role == "system":
+            continue
+        if role == "tool":
+            result = {
+                "type": "tool_result",
+                "tool_use_id": message.get("tool_call_id", ""),
+                "content": message.get("content", ""),
+            }
+            if history and history[-1].get("_results"):
+                history[-1]["content"].append(result)
+            else:
+                history.append({"role": "user", "content": [result], "_results": True})
+        elif role == "assistant" and message.get("tool_calls"):
+            blocks = [{"type": "text", "text": message["content"]}] if message.get("content") else []
+            for call in message["tool_calls"]:
+                arguments = call["function"].get("arguments")
+                blocks.append(
+                    {
+                        "type": "tool_use",
+                        "id": call["id"],
+                        "name": call["function"]["name"],
+                        "input": json.loads(arguments) if arguments else {},
+                    }
+                )
+            converted = {"role": "assistant", "content": blocks}
+            history.append(answered.get(_tool_use_ids(converted), converted))
+        else:
+            history.append({"role": role, "content": message.get("content")})
+    return prepare_messages(history)
+
+
+def _run_in_thread(func: Callable, *args, **kwargs) -> asyncio.Future:
+    """
+    Run a blocking call in a daemon thread.
+    Unlike asyncio.to_thread() an abandoned call doesn't hold up the shutdown of the event loop (E.g. on SIGINT).
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def settle(setter: Callable, value: Any) -> None:
+        if not future.done():
+            setter(value)
+
+    def run() -> None:
+        try:
+            result, setter = func(*args, **kwargs), future.set_result
+        except Exception as e:
+            result, setter = e, future.set_exception
+        try:
+            loop.call_soon_threadsafe(settle, setter, result)
+        except RuntimeError:
+            pass  # The event loop is already closed, nobody is waiting anymore
+
+    threading.Thread(target=run, name="chat-engine", daemon=True).start()
+    return future
+
+
+def _close(iterable: Iterable) -> None:
+    """
+    Close a response stream (and with it the HTTP connection) while another thread may still iterate it.
+    unichat wraps the SDK stream in a generator, which only the iterating thread can close, so the SDK stream is
+    closed instead. The iterating thread then stops with an error and closes the generator itself.
+    """
+    if inspect.isgenerator(iterable):
+        frame = iterable.gi_frame
+        iterable = frame.f_locals.get("response") if frame is not None else None
+    getattr(iterable, "close", lambda: None)()
+
+
+async def _iterate_in_thread(iterable: Iterable) -> AsyncIterator:
+    """
+    Pull the items of a blocking iterable (E.g. a response stream) without blocking the event loop.
+    Once the consumer stops (break, cancellation or an error) the iterable is closed, so the provider stops generating.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def pump() -> None:
+        error = None
+        try:
+            for item in iterable:
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+        except Exception as e:
+            error = e  # Also raised by call_soon_threadsafe() once the event loop is closed
+        if stop.is_set():
+            getattr(iterable, "close", lambda: None)()  # Not running anymore, so a generator can be closed as well
+            return
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, error if error else _DONE)
+        except RuntimeError:
+            pass
+
+    threading.Thread(target=pump, name="chat-engine-stream", daemon=True).start()
+    try:
+        while (item := await queue.get()) is not _DONE:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        if not stop.is_set():
+            stop.set()
+            _close(iterable)
+
+
+class ChatEngine:
+    """
+    Gets the replies of a model for a conversation, independent of how they are shown.
+    Every call of run() is an async iterator of ChatEvents, so any number of conversations can run in one
+    process and a consumer can stop (or cancel) a reply at any time.
+    """
+
+    def __init__(
+        self,
+        model: Dict[str, Any],
+        conversation: List[Dict[str, Any]],
+        temperature: float,
+        tools: Optional[List[Dict[str, Any]]] = None,
+        cached: bool = False,
+        chat_id: Optional[str] = None,
+    ) -> None:
+        """
+        :param model: The model data from the model menu (api_key, model_name, model_title, ...)
+        :param conversation: The conversation, updated in place with every reply
+        :param temperature: Sampling temperature
+        :param tools: Tools offered to the model
+        :param cached: Use the prompt cache (Anthropic models)
+        :param chat_id: Id of the chat in the cost ledger
+        """
+        self.model = model
+        self.conversation = conversation
+        self.temperature = temperature
+        self.tools = tools or []
+        self.cached = cached
+        self.chat_id = chat_id or new_chat_id()
+        self._resuming = False
+        self._sent_tokens = 0  # Input tokens of the latest request, counted from the conversation
+        self._request_started = 0.0
+        self.token_counter = TokenCounter(model["model_name"])
+        self.client = new_client(model)
+
+    @property
+    def context_window(self) -> int:
+        """
+        Tokens available for the messages of a request, 0 if the model has no model_context_tokens
+        The context window minus the room of the reply (model_max_tokens, at least the reply_reserve).
+        """
+        context_tokens = self.model.get("model_context_tokens")
+        if not context_tokens:
+            return 0
+        reply_tokens = max(
+            self.model.get("model_max_tokens") or 0, fetch_variable("context", "reply_reserve", default=1024)
+        )
+        return max(context_tokens - reply_tokens, 0)
+
+    @property
+    def context_budget(self) -> int:
+        """Tokens available for the messages of a request when trimming the history, 0 for no limit"""
+        return self.context_window if fetch_variable("context", "trim_history", default=True) else 0
+
+    def _fit_context(self) -> Tuple[List[Dict[str, Any]], ContextUsage]:
+        """Supporting function, the messages which are sent (without compacted ones) and their share of the budget."""
+        active = [message for message in self.conversation if is_active(message)]
+        return fit_to_budget(active, self.token_counter, self.context_budget)
+
+    def context_usage(self) -> ContextUsage:
+        """:return: How much of the context budget the next request would use"""
+        return self._fit_context()[1]
+
+    async def _compact(self) -> AsyncIterator[ChatEvent]:
+        """
+        Supporting function for run(), replaces the older turns with a summary once the conversation
+        uses more than [chat.context] compaction_threshold of the context window (opt-in).
+        """
+        budget = self.context_window
+        if not fetch_variable("context", "compaction", default=False) or not budget:
+            return
+        active = [message for message in self.conversation if is_active(message)]
+        if self.token_counter.count(active) <= budget * fetch_variable("context", "compaction_threshold", default=0.75):
+            return
+        indices = compaction_span(self.conversation, fetch_variable("context", "keep_recent_turns", default=4))
+        if not indices:
+            return
+
+        try:
+            summary = await _run_in_thread(summarize, [self.conversation[i] for i in indices])
+        except Exception as e:
+            yield ChatEvent("notice", f"Could not compact the conversation: {e}")
+            return
+        record_usage(self.chat_id, summary.model, summary.usage, summary.latency)
+        if not summary.text:
+            yield ChatEvent("notice", "Could not compact the conversation: the summary is empty")
+            return
+        yield ChatEvent("compacted", apply_summary(self.conversation, indices, summary))
+
+    def _params(self, streaming: bool) -> Dict[str, Any]:
+        """Supporting function for run(), the arguments of the completion request."""
+        messages, usage = self._fit_context()
+        self._sent_tokens = usage.used
+        # unichat only sends the cached block along with a system prompt
+        use_cache = self.cached and bool(messages) and messages[0].get("role") == "system"
+        messages, cached = plan_cache(messages, self.token_counter, use_cache)
+        messages = prepare_messages(messages)
+        if self._resuming:
+            messages.append({"role": "user", "content": CONTINUE_PROMPT})
+            self._sent_tokens += MESSAGE_OVERHEAD + self.token_counter.count_text(CONTINUE_PROMPT)
+        params = {
+            "model": self.model["model_name"],
+            "messages": messages,
+            "temperature": self.temperature,
+            "tools": self.tools,
+            "stream": streaming,
+        }
+        if cached is not False:
+            params["cached"] = cached
+        if self.model["model_title"] == "anthropic-sonnet-latest-thinking":
+            params["thinking"] = True
+        return params
+
+    async def _request(self, params: Dict[str, Any]) -> Any:
+        """Supporting function for run(), sends the request and retries on connection errors, rate limits and 5xx."""
+        # The stored images are only read (and encoded) for the request itself
+        anthropic = self.model["model_title"].startswith("anthropic")
+        params = {**params, "messages": materialize(params["messages"], anthropic)}
+        # unichat keeps its own Anthropic conversation and only appends the last message of every request.
+        # Set it from the messages sent now (before every attempt), so a retry doesn't repeat the last message and
+        # a trimmed, compacted or switched conversation reaches the model as it is.
+        helper = getattr(self.client, "_api_helper", None)
+        history = None
+        if helper is not None and self.model["model_name"] in helper.models["anthropic_models"]:
+            history = anthropic_history(params["messages"], helper.anthropic_conversation)
+            system = [message for message in params["messages"] if message.get("role") == "system"]
+            params["messages"] = system + history
+        for delay in (*RETRY_DELAYS, None):
+            self._request_started = time.monotonic()
+            if history is not None:
+                helper.anthropic_conversation = history[:-1]
+            try:
+                return await _run_in_thread(self.client.chat.completions.create, **params)
+            except Exception as e:
+                if delay is None or not is_transient(e):
+                    raise
+                await asyncio.sleep(delay)
+
+    def _record_usage(self, reported: Any, message: Dict[str, Any]) -> None:
+        """
+        Supporting function for run(), adds the request to the cost ledger.
+        Providers don't always report the usage (E.g. for streamed replies), it's counted locally then.
+        :param reported: The usage block of the response, if any
+        :param message: The assistant message of the reply
+        """
+        usage = usage_from_response(reported)
+        if usage is None:
+            output = self.token_counter.count_text(message["content"]) + sum(
+                self.token_counter.count_text(call["function"]["arguments"]) for call in message.get("tool_calls", [])
+            )
+            usage = Usage(self._sent_tokens, output, estimated=True)
+        # Kept with the reply, so the cache hits and misses of every turn can be told apart.
+        # Without reported cached tokens there's nothing to tell apart, so no cache figures are kept then.
+        message["_usage"] = {
+            key: value
+            for key, value in usage._asdict().items()
+            if usage.cache_reported or key not in ("cache_read_tokens", "cache_write_tokens", "cache_reported")
+        }
+        record_usage(self.chat_id, self.model, usage, time.monotonic() - self._request_started, self.cached)
+
+    def _add_reply(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Supporting function for run(), adds an assistant message to the conversation.
+        A resumed reply is joined with the interrupted one instead.
+        :param message: The assistant message
+        :return: The message as it was added
+        """
+        if not self._resuming:
+            self.conversation.append(message)
+            return message
+        self._resuming = False
+        message = {**message, "content": self.conversation[-1]["content"] + message["content"]}
+        self.conversation[-1] = message
+        return message
+
+    async def _streamed_reply(self, response: Any) -> AsyncIterator[ChatEvent]:
+        """Supporting function for run(), turns the chunks of a streamed response into events."""
+        message = {"role": "assistant", "content": ""}
+        content = []
+        tool_calls = []
+        usage = None
+        yield ChatEvent("reply_start")
+        try:
+            async for chunk in _iterate_in_thread(response):
+                # The usage is only part of the last chunk (if the provider sends it at all)
+                usage = getattr(chunk, "usage", None) or usage
+                if not getattr(chunk, "choices", None):
+                    continue
+                delta = chunk.choices[0].delta
+
+                if getattr(delta, "reasoning_content", None):
+                    yield ChatEvent("reasoning", delta.reasoning_content)
+
+                if getattr(delta, "content", None):
+                    content.append(delta.content)
+                    yield ChatEvent("content", delta.content)
+
+                for tool_call in getattr(delta, "tool_calls", None) or []:
+                    # A call with an id starts a new tool call, the ones without continue the arguments of the last one
+                    if getattr(tool_call, "id", None):
+                        function = {"name": getattr(tool_call.function, "name", "") or "", "arguments": ""}
+                        tool_calls.append({"id": tool_call.id, "type": "function", "function": function})
+                    arguments = getattr(getattr(tool_call, "function", None), "arguments", None)
+                    if arguments and tool_calls:
+                        tool_calls[-1]["function"]["arguments"] += arguments
+        except asyncio.CancelledError:
+            # Keep the partial answer so it can be resumed, incomplete tool calls can't be executed anyway
+            partial = {"role": "assistant", "content": "".join(content), "_truncated": True}
+            self._record_usage(usage, partial)
+            if content:
+                self._add_reply(partial)
+            raise
+
+        message["content"] = "".join(content)
+        if tool_calls:
+            message["tool_calls"] = tool_calls
+        self._record_usage(usage, message)
+        yield ChatEvent("reply_end", self._add_reply(message))
+
+    async def _complete_reply(self, response: Any) -> AsyncIterator[ChatEvent]:
+        """Supporting function for run(), turns a non-streamed response into events."""
+        message = response.choices[0].message
+        assistant_message = {"role": "assistant", "content": ""}
+        yield ChatEvent("reply_start")
+
+        if reasoning_content := getattr(message, "reasoning_content", None):
+            yield ChatEvent("reasoning", reasoning_content)
+        if content := getattr(message, "content", None):
+            assistant_message["content"] = content
+            yield ChatEvent("content", content)
+
+        tool_calls = []
+        for tool_call in getattr(message, "tool_calls", None) or []:
+            if tool_fn := getattr(tool_call, "function", None):
+                function = {"name": getattr(tool_fn, "name", ""), "arguments": getattr(tool_fn, "arguments", "{}")}
+                tool_calls.append({"id": getattr(tool_call, "id", ""), "type": "function", "function": function})
+        if tool_calls:
+            assistant_message["tool_calls"] = tool_calls
+        self._record_usage(getattr(response, "usage", None), assistant_message)
+        yield ChatEvent("reply_end", self._add_reply(assistant_message))
+
+    async def _cached_reply(self, entry: Dict[str, Any]) -> AsyncIterator[ChatEvent]:
+        """Supporting function for run(), replays a reply from the response cache (at once, also when streaming)."""
+        message = {"role": "assistant", "content": entry.get("content") or "", "_cached": True}
+        yield ChatEvent("reply_start")
+        if entry.get("reasoning"):
+            yield ChatEvent("reasoning", entry["reasoning"])
+        if message["content"]:
+            yield ChatEvent("content", message["content"])
+        if entry.get("tool_calls"):
+            message["tool_calls"] = entry["tool_calls"]
+        yield ChatEvent("reply_end", self._add_reply(message))
+
+    def can_resume(self) -> bool:
+        """:return: True if the last reply was interrupted and can be continued"""
+        return bool(self.conversation) and bool(self.conversation[-1].get("_truncated"))
+
+    async def run(self, streaming: bool, resume: bool = False) -> AsyncIterator[ChatEvent]:
+        """
+        Get the reply to the conversation, executing the requested tools until the model answers.
+        :param streaming: Stream the reply (deltas) or get it at once
+        :param resume: Continue the interrupted last reply (see can_resume()) instead of answering anew
+        :return: Async iterator of ChatEvents
+        """
+        async for event in self._compact():
+            yield event
+
+        start_length = len(self.conversation)
+        interrupted_reply = self.conversation[-1] if resume and self.can_resume() else None
+        self._resuming = interrupted_reply is not None
+        try:
+            while True:
+                params = self._params(streaming)
+                cache_key = request_key(params) if is_cacheable(params) else None
+                cached_entry = ResponseCache.shared().get(cache_key) if cache_key else None
+                if cached_entry:
+                    reply = self._cached_reply(cached_entry)
+                else:
+                    response = await self._request(params)
+                    reply = self._streamed_reply(response) if streaming else self._complete_reply(response)
+                texts: Dict[str, List[str]] = {"reasoning": [], "content": []}
+                async for event in reply:
+                    if event.kind in texts:
+                        texts[event.kind].append(event.data)
+                    yield event
+
+                if cache_key and not cached_entry:
+                    # Only this request's part of the reply, a resumed one is joined with the interrupted one
+                    entry = {kind: "".join(parts) for kind, parts in texts.items()}
+                    entry["tool_calls"] = self.conversation[-1].get("tool_calls", [])
+                    entry["usage"] = self.conversation[-1].get("_usage")
+                    ResponseCache.shared().put(cache_key, entry)
+
+                tool_calls = self.conversation[-1].get("tool_calls")
+                if not tool_calls:
+                    return
+                calls = [
+                    ToolCall(call["id"], call["function"]["name"], call["function"]["arguments"]) for call in tool_calls
+                ]
+                yield ChatEvent("tool_calls", calls)
+                results = await _run_in_thread(execute_tool_calls, calls, announce=False)
+                tool_messages = [
+                    {"role": "tool", "content": result.content, "tool_call_id": result.tool_call_id}
+                    for result in results
+                ]
+                self.conversation.extend(tool_messages)
+                yield ChatEvent("tool_results", tool_messages)
+        except Exception as e:
+            del self.conversation[start_length:]
+            if interrupted_reply is not None:
+                self.conversation[-1] = interrupted_reply
+            self._resuming = False
+            yield ChatEvent("error", e)
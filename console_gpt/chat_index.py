@@ -0,0 +1,316 @@
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from console_gpt.cache_planner import ATTACHMENT_KEY
+from console_gpt.chat_journal import CHAT_SUFFIXES, load_chat
+from console_gpt.config_manager import BASE_PATH, CHATS_PATH
+from console_gpt.token_counter import TokenCounter
+
+"""
+Chat library index - metadata and the full text of every saved chat in a small SQLite database
+Listing, previewing and searching chats only reads the index, a chat file is parsed again only after it changed
+(told by its size and modification time).
+"""
+
+INDEX_PATH = os.path.join(BASE_PATH, "app-data", "chat_index.sqlite3")
+# Bumped whenever the schema changes, an index of another version is built anew
+SCHEMA_VERSION = 2
+TITLE_LENGTH = 80
+PREVIEW_LENGTH = 300
+SNIPPET_TOKENS = 12
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chats (
+    name TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    model TEXT NOT NULL,
+    messages INTEGER NOT NULL,
+    tokens INTEGER NOT NULL,
+    preview TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS message_text (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS message_text_name ON message_text (name);
+"""
+# Full-text search of the messages, only if SQLite was built with FTS5 (searches fall back to LIKE otherwise)
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS message_search USING fts5(
+    content, content='message_text', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS message_added AFTER INSERT ON message_text BEGIN
+    INSERT INTO message_search (rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS message_removed AFTER DELETE ON message_text BEGIN
+    INSERT INTO message_search (message_search, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+"""
+
+
+class ChatInfo(NamedTuple):
+    name: str  # File name in CHATS_PATH
+    title: str  # First line of the first user message
+    model: str  # Key of the model in [chat.models], empty if unknown
+    messages: int
+    tokens: int
+    modified: float  # Timestamp of the last change
+    preview: str  # Start of the first user message (or why the chat can't be read)
+
+
+class SearchHit(NamedTuple):
+    name: str  # File name in CHATS_PATH
+    position: int  # Index of the best matching message in the chat
+    role: str
+    snippet: str  # The matching part of the message, the matches are marked with « »
+    score: float  # BM25, lower is better
+
+
+def message_text(message: Dict[str, Any]) -> str:
+    """
+    :param message: A message of a chat
+    :return: Its text (the text parts of a multipart content, the attachment of a cached input)
+    """
+    content = message.get("content")
+    if isinstance(content, list):
+        content = "\n".join(part.get("text", "") for part in content if isinstance(part, dict))
+    text = content if isinstance(content, str) else ""
+    if attachment := message.get(ATTACHMENT_KEY):
+        text = f"{text}\n{attachment}"
+    return text
+
+
+def _describe(conversation: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Supporting function, the metadata of a chat
+    :param conversation: The messages of the chat
+    :return: Values of the title, messages, tokens and preview columns
+    """
+    first_input = next((message_text(m) for m in conversation if m.get("role") == "user"), "").strip()
+    return {
+        "title": (first_input.splitlines() or [""])[0][:TITLE_LENGTH],
+        "messages": len(conversation),
+        "tokens": TokenCounter("").count([m for m in conversation if isinstance(m, dict)]),
+        "preview": first_input[:PREVIEW_LENGTH],
+    }
+
+
+class ChatIndex:
+    """The metadata of the chats in CHATS_PATH, kept in sync with the folder on every listing."""
+
+    _instance: Optional["ChatIndex"] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, path: str = INDEX_PATH, chats_path: str = CHATS_PATH) -> None:
+        self.chats_path = chats_path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        if self._db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            for table in ("message_search", "message_text", "chats"):
+                try:
+                    self._db.execute(f"DROP TABLE IF EXISTS {table}")
+                except sqlite3.OperationalError:  # The FTS5 table of an index built by another SQLite
+                    pass
+        self._db.executescript(SCHEMA)
+        self.full_text = self._create_search()
+        self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _create_search(self) -> bool:
+        """
+        Supporting function for __init__(), sets up the full-text search
+        :return: False if SQLite lacks FTS5, the messages are then searched with LIKE
+        """
+        triggers = self._db.execute("SELECT count(*) FROM sqlite_master WHERE type = 'trigger'").fetchone()[0]
+        try:
+            self._db.executescript(SEARCH_SCHEMA)
+        except sqlite3.OperationalError:
+            # Without the triggers the messages can still be written (they'd fail on the missing module)
+            for trigger in ("message_added", "message_removed"):
+                self._db.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            return False
+        if not triggers:
+            # Messages written without FTS5 (or before the first start) are added to the full-text index
+            self._db.execute("INSERT INTO message_search (message_search) VALUES ('rebuild')")
+            self._db.commit()
+        return True
+
+    @classmethod
+    def shared(cls) -> "ChatIndex":
+        """:return: The chat index of this process"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def _store(self, name: str, stat: os.stat_result, conversation: List[Dict[str, Any]], model: str) -> None:
+        """Supporting function, writes the row and the messages of a chat (within the caller's transaction)."""
+        values = _describe(conversation)
+        row = (name, stat.st_mtime_ns, stat.st_size, values["title"], model, values["messages"], values["tokens"])
+        self._db.execute("INSERT OR REPLACE INTO chats VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (*row, values["preview"]))
+        self._db.execute("DELETE FROM message_text WHERE name = ?", (name,))
+        self._db.executemany(
+            "INSERT INTO message_text (name, position, role, content) VALUES (?, ?, ?, ?)",
+            [
+                (name, position, str(message.get("role", "")), text)
+                for position, message in enumerate(conversation)
+                if (text := message_text(message).strip())
+            ],
+        )
+
+    def update(self, name: str, conversation: List[Dict[str, Any]], model: str = "") -> None:
+        """
+        Index a chat which was just saved, from the conversation in memory
+        :param name: File name of the chat in CHATS_PATH
+        :param conversation: The conversation as saved
+        :param model: Key of the model in [chat.models] (keeps the known one if empty)
+        """
+        try:
+            stat = os.stat(os.path.join(self.chats_path, name))
+        except OSError:
+            return
+        with self._lock, self._db:
+            if not model:
+                row = self._db.execute("SELECT model FROM chats WHERE name = ?", (name,)).fetchone()
+                model = row[0] if row else ""
+            self._store(name, stat, conversation, model)
+
+    def remove(self, name: str) -> None:
+        """:param name: File name of a deleted chat"""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM chats WHERE name = ?", (name,))
+            self._db.execute("DELETE FROM message_text WHERE name = ?", (name,))
+
+    def refresh(self) -> List[ChatInfo]:
+        """
+        Bring the index up to date with the folder, only new and changed chats are read
+        :return: All chats, the most recently modified first
+        """
+        with self._lock, self._db:
+            known = {
+                name: (mtime_ns, size, model)
+                for name, mtime_ns, size, model in self._db.execute("SELECT name, mtime_ns, size, model FROM chats")
+            }
+            found = set()
+            with os.scandir(self.chats_path) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(CHAT_SUFFIXES) or not entry.is_file():
+                        continue
+                    found.add(entry.name)
+                    stat = entry.stat()
+                    previous = known.get(entry.name)
+                    if previous and previous[:2] == (stat.st_mtime_ns, stat.st_size):
+                        continue
+                    try:
+                        conversation = load_chat(entry.path)
+                        if not isinstance(conversation, list):
+                            raise ValueError("a chat must be a list of messages")
+                        self._store(entry.name, stat, conversation, previous[2] if previous else "")
+                    except (OSError, ValueError, AttributeError) as e:
+                        self._db.execute(
+                            "INSERT OR REPLACE INTO chats VALUES (?, ?, ?, '', '', 0, 0, ?)",
+                            (entry.name, stat.st_mtime_ns, stat.st_size, f"Unable to parse chat due to: {e}"),
+                        )
+                        self._db.execute("DELETE FROM message_text WHERE name = ?", (entry.name,))
+            removed = [(name,) for name in known.keys() - found]
+            self._db.executemany("DELETE FROM chats WHERE name = ?", removed)
+            self._db.executemany("DELETE FROM message_text WHERE name = ?", removed)
+            rows = self._db.execute(
+                "SELECT name, title, model, messages, tokens, mtime_ns, preview FROM chats ORDER BY mtime_ns DESC"
+            ).fetchall()
+        return [ChatInfo(*row[:5], row[5] / 1e9, row[6]) for row in rows]
+
+    def search(self, query: str, limit: int = 20) -> List[SearchHit]:
+        """
+        Find the chats mentioning all words of the query (the last one may be the start of a word)
+        :param query: The words to look for
+        :param limit: Maximum number of chats
+        :return: The best matching message of each chat, the best chats first (call refresh() before)
+        """
+        words = query.split()
+        if not words:
+            return []
+        if not self.full_text:
+            return self._search_like(words, limit)
+        # Quoted, so characters like - or : aren't read as the query syntax of FTS5
+        exact = " ".join('"' + word.replace('"', '""') + '"' for word in words)
+        # Whole words rank above the ones which only start with the last word
+        match = f"({exact}) OR ({exact}*)"
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT t.name, t.position, t.role, "
+                f"snippet(message_search, 0, '«', '»', '…', {SNIPPET_TOKENS}), bm25(message_search) AS score "
+                "FROM message_search JOIN message_text AS t ON t.id = message_search.rowid "
+                "WHERE message_search MATCH ? ORDER BY score",
+                (match,),
+            )
+            hits: Dict[str, SearchHit] = {}
+            for row in rows:
+                if row[0] not in hits:
+                    hits[row[0]] = SearchHit(*row)
+                    if len(hits) == limit:
+                        break
+        return list(hits.values())
+
+    def _search_like(self, words: List[str], limit: int) -> List[SearchHit]:
+        """
+        Supporting function for search() without FTS5, the first message of each chat containing all words
+        :param words: The words to look for (anywhere in a word, ASCII letters regardless of their case)
+        :param limit: Maximum number of chats
+        :return: The matching messages, the most recently modified chats first
+        """
+        patterns = ["%" + word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%" for word in words]
+        where = " AND ".join("t.content LIKE ? ESCAPE '\\'" for _ in patterns)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT t.name, t.position, t.role, t.content FROM message_text AS t JOIN chats AS c ON c.name = t.name "
+                f"WHERE {where} ORDER BY c.mtime_ns DESC, t.position",
+                patterns,
+            )
+            hits: Dict[str, SearchHit] = {}
+            for name, position, role, content in rows:
+                if name not in hits:
+                    hits[name] = SearchHit(name, position, role, _snippet(content, words), 0.0)
+                    if len(hits) == limit:
+                        break
+        return list(hits.values())
+
+
+def _snippet(content: str, words: List[str]) -> str:
+    """
+    Supporting function for ChatIndex._search_like(), the part of a message around its first match (like FTS5's)
+    :param content: Text of the message
+    :param words: The words which were searched for
+    :return: About SNIPPET_TOKENS words around the match, the matches marked with « »
+    """
+    tokens = content.split()
+    lowered = [word.lower() for word in words]
+    first = next((i for i, token in enumerate(tokens) if any(word in token.lower() for word in lowered)), 0)
+    start = max(first - SNIPPET_TOKENS // 2, 0)
+    part = [
+        f"«{token}»" if any(word in token.lower() for word in lowered) else token
+        for token in tokens[start : start + SNIPPET_TOKENS]
+    ]
+    return ("…" if start else "") + " ".join(part) + ("…" if start + SNIPPET_TOKENS < len(tokens) else "")
+
+
+def chat_preview(info: ChatInfo) -> str:
+    """
+    :param info: Metadata of a chat
+    :return: Text for the preview box of the chat menus
+    """
+    details = [
+        info.model,
+        f"{info.messages} messages",
+        f"~{info.tokens:,} tokens",
+        datetime.fromtimestamp(info.modified).strftime("%Y-%m-%d %H:%M"),
+    ]
+    return f"{info.title}\n{' · '.join(detail for detail in details if detail)}\n\n{info.preview}"
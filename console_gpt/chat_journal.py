@@ -0,0 +1,204 @@
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from console_gpt.config_manager import CHATS_PATH, fetch_variable
+from console_gpt.cost_tracker import new_chat_id
+from console_gpt.custom_stdout import custom_print
+
+"""
+Chat journal - keeps the running chat on disk as it grows, one JSON message per line
+New messages are appended (and fsynced in batches), any other change of the history (E.g. a compaction or a removed
+message) rewrites the journal into a temporary file which atomically replaces it. Chats saved as .json are still
+read and written as before.
+"""
+
+JOURNAL_SUFFIX = ".jsonl"
+CHAT_SUFFIXES = (".json", JOURNAL_SUFFIX)
+
+
+def load_chat(path: str) -> List[Dict[str, Any]]:
+    """
+    Read a saved chat in either format
+    :param path: Path to a .json chat or a .jsonl journal
+    :return: The conversation
+    :raises json.JSONDecodeError: If the file isn't a valid chat
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        if not path.endswith(JOURNAL_SUFFIX):
+            return json.load(f)
+        lines = [line for line in f if line.strip()]
+    conversation = []
+    for line_number, line in enumerate(lines, 1):
+        try:
+            conversation.append(json.loads(line))
+        except json.JSONDecodeError:
+            # Only the last line can be incomplete (the app stopped while writing it)
+            if line_number < len(lines):
+                raise
+    return conversation
+
+
+def _fsync_dir(path: str) -> None:
+    """Supporting function, makes a rename in the directory durable (not supported on every platform)."""
+    try:
+        fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class ChatJournal:
+    """
+    Journal of one conversation. sync() writes whatever changed since the previous call, so it can be called after
+    every change of the conversation without rewriting it.
+    """
+
+    _active: Optional["ChatJournal"] = None  # Journal of the chat running in this process
+
+    def __init__(self, path: str, model: str = "") -> None:
+        self.path = path
+        self.model = model  # Key of the model in [chat.models]
+        self.saved = False  # Saved by the user (kept if the chat ends without saving)
+        self._file = None
+        # (message, number of keys, content) of every line, to tell if a message was changed in place
+        self._written: List[Tuple[Dict[str, Any], int, Any]] = []
+        self._last_fsync = 0.0
+        self._unsynced = False
+        self._closed = False
+
+    @classmethod
+    def start(cls, conversation: List[Dict[str, Any]], model: str = "") -> Optional["ChatJournal"]:
+        """
+        Start the journal of a new chat session, the one of the previous session is dropped unless it was saved
+        :param conversation: The conversation of the chat
+        :param model: Key of the model in [chat.models]
+        :return: The journal or None if journaling is disabled
+        """
+        if cls._active is not None:
+            cls._active.discard()
+            cls._active = None
+        if not fetch_variable("journal", "enabled", default=True):
+            return None
+        path = os.path.join(CHATS_PATH, new_chat_id() + JOURNAL_SUFFIX)
+        cls._active = cls(path, model)
+        cls._active.sync(conversation)
+        return cls._active
+
+    @classmethod
+    def active(cls) -> Optional["ChatJournal"]:
+        """:return: The journal of the running chat, if any"""
+        return cls._active
+
+    @classmethod
+    def sync_active(cls, conversation: List[Dict[str, Any]]) -> None:
+        """:param conversation: The conversation of the running chat, written to its journal (if any)"""
+        if cls._active is not None:
+            cls._active.sync(conversation)
+
+    @staticmethod
+    def _signature(message: Dict[str, Any]) -> Tuple[Dict[str, Any], int, Any]:
+        return message, len(message), message.get("content")
+
+    @staticmethod
+    def _lines(messages: List[Dict[str, Any]]) -> str:
+        return "".join(json.dumps(message, ensure_ascii=False) + "\n" for message in messages)
+
+    def sync(self, conversation: List[Dict[str, Any]]) -> None:
+        """
+        Write the changes of the conversation since the last call
+        :param conversation: The conversation
+        """
+        if self._closed:
+            return
+        if self._file is None and not any(message.get("role") != "system" for message in conversation):
+            return  # Nothing worth keeping yet
+        unchanged = 0
+        for (written, keys, content), message in zip(self._written, conversation):
+            if message is not written or len(message) != keys or message.get("content") is not content:
+                break
+            unchanged += 1
+        try:
+            if unchanged < len(self._written):
+                self._rewrite(conversation)
+            elif unchanged < len(conversation):
+                self._append(conversation[unchanged:])
+        except (OSError, TypeError) as e:
+            custom_print("warn", f"Could not update the chat journal, it's disabled for this chat: {e}")
+            self.close()
+
+    def _append(self, messages: List[Dict[str, Any]]) -> None:
+        """Supporting function for sync(), adds new messages at the end of the journal."""
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(self._lines(messages))
+        self._file.flush()
+        self._written.extend(map(self._signature, messages))
+        self._unsynced = True
+        if time.monotonic() - self._last_fsync >= fetch_variable("journal", "fsync_interval", default=1.0):
+            self._fsync()
+
+    def _rewrite(self, conversation: List[Dict[str, Any]]) -> None:
+        """Supporting function for sync(), replaces the journal atomically with the current conversation."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self._lines(conversation))
+            f.flush()
+            os.fsync(f.fileno())
+        if self._file is not None:
+            self._file.close()
+        os.replace(tmp_path, self.path)
+        _fsync_dir(self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._written = list(map(self._signature, conversation))
+        self._last_fsync = time.monotonic()
+        self._unsynced = False
+
+    def _fsync(self) -> None:
+        """Supporting function, forces the appended lines to the disk."""
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+        self._last_fsync = time.monotonic()
+        self._unsynced = False
+
+    def save_as(self, path: str, conversation: List[Dict[str, Any]]) -> None:
+        """
+        Keep the journal under the given name, it goes on being updated there
+        :param path: Path of the saved chat (.jsonl)
+        :param conversation: The conversation
+        """
+        self.sync(conversation)
+        if self._file is None:
+            self._rewrite(conversation)
+        self._fsync()
+        if path != self.path:
+            os.replace(self.path, path)
+            _fsync_dir(path)
+            self.path = path
+        self.saved = True
+
+    def close(self) -> None:
+        """Write the pending lines to the disk and stop journaling."""
+        if self._file is not None:
+            try:
+                self._fsync()
+            except OSError:
+                pass
+            self._file.close()
+            self._file = None
+        self._closed = True
+
+    def discard(self) -> None:
+        """Stop journaling and remove the journal, unless the user saved it."""
+        self.close()
+        if not self.saved:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
@@ -0,0 +1,127 @@
+import time
+from typing import Any, Dict, List, NamedTuple
+
+from unichat import UnifiedChatApi
+
+from console_gpt.cache_planner import inline_attachment
+from console_gpt.config_manager import fetch_variable
+from console_gpt.cost_tracker import Usage, usage_from_response
+from console_gpt.token_counter import split_turns
+
+"""
+Conversation compaction - replaces the older turns of a long chat with a summary written by a cheap model
+The compacted messages stay in the conversation (and the saved chat) marked with "_compacted", they are just not sent.
+"""
+
+SUMMARY_PREFIX = "Summary of our earlier conversation (the older messages were compacted):"
+COMPACTION_PROMPT = (
+    "Summarize the conversation below so it can replace it as context for the rest of the chat. "
+    "Keep every fact, decision, name, number, code identifier, file name and open question. "
+    "Leave out greetings and repetitions. Use the language of the conversation and reply with the summary only."
+)
+# Tool results are cut to this many characters in the transcript for the summary
+MAX_TOOL_RESULT_CHARS = 2000
+
+
+class Summary(NamedTuple):
+    text: str
+    model: Dict[str, Any]  # The model which wrote it (incl. model_title)
+    usage: Usage
+    latency: float
+
+
+def is_active(message: Dict[str, Any]) -> bool:
+    """:return: True if the message is still sent (not replaced by a summary)"""
+    return not message.get("_compacted")
+
+
+def compaction_span(conversation: List[Dict[str, Any]], keep_turns: int) -> List[int]:
+    """
+    Find the messages to compact: all active turns except the latest ones (leading system messages are kept)
+    :param conversation: The conversation
+    :param keep_turns: Number of recent turns which are kept as they are
+    :return: Indices of the messages to compact (empty if there's nothing to compact)
+    """
+    indices = [i for i, message in enumerate(conversation) if is_active(message)]
+    while indices and conversation[indices[0]].get("role") == "system":
+        indices.pop(0)
+    turns = split_turns([conversation[i] for i in indices])
+    if len(turns) <= keep_turns:
+        return []
+    return indices[: sum(len(turn) for turn in turns[: len(turns) - keep_turns])]
+
+
+def _transcript(messages: List[Dict[str, Any]]) -> str:
+    """
+    Supporting function for summarize(), the messages as plain text
+    :param messages: The messages to summarize
+    :return: One block per message
+    """
+    blocks = []
+    for message in map(inline_attachment, messages):
+        content = message.get("content")
+        if isinstance(content, list):
+            content = "\n".join(
+                part.get("text", "[image]") if isinstance(part, dict) else str(part) for part in content
+            )
+        content = (content or "").removeprefix(SUMMARY_PREFIX)
+        if message.get("role") == "tool" and len(content) > MAX_TOOL_RESULT_CHARS:
+            content = content[:MAX_TOOL_RESULT_CHARS] + " [...]"
+        for tool_call in message.get("tool_calls") or []:
+            function = tool_call.get("function", {})
+            content += f"\n[called the tool {function.get('name')} with {function.get('arguments')}]"
+        role = "previous summary" if message.get("_summary") else message.get("role", "user")
+        blocks.append(f"{role}: {content.strip()}")
+    return "\n\n".join(blocks)
+
+
+def summarize(messages: List[Dict[str, Any]]) -> Summary:
+    """
+    Write the summary with the model of defaults.assistant (blocking)
+    :param messages: The messages to summarize (a previous summary among them is summarized along)
+    :return: The summary
+    :raises KeyError: If the model of defaults.assistant isn't configured
+    """
+    model_title = fetch_variable("context", "compaction_model", default="") or fetch_variable("defaults", "assistant")
+    model = {**fetch_variable("models")[model_title], "model_title": model_title}
+    started = time.monotonic()
+    response = UnifiedChatApi(api_key=model["api_key"]).chat.completions.create(
+        model=model["model_name"],
+        messages=[
+            {"role": "system", "content": COMPACTION_PROMPT},
+            {"role": "user", "content": _transcript(messages)},
+        ],
+        temperature=0,
+        stream=False,
+    )
+    text = response.choices[0].message.content or ""
+    usage = usage_from_response(getattr(response, "usage", None)) or Usage(0, 0, estimated=True)
+    return Summary(text.strip(), model, usage, time.monotonic() - started)
+
+
+def apply_summary(conversation: List[Dict[str, Any]], indices: List[int], summary: Summary) -> Dict[str, Any]:
+    """
+    Mark the summarized messages as compacted and insert the summary right after them
+    :param conversation: The conversation, changed in place
+    :param indices: Indices of the summarized messages (from compaction_span())
+    :param summary: The summary of them
+    :return: The summary message
+    """
+    # A previous summary among them is replaced as well, the new one covers its span too
+    start = min(conversation[i].get("_summary", {}).get("start", i) for i in indices)
+    end = max(conversation[i].get("_summary", {}).get("end", i) for i in indices)
+    for i in indices:
+        conversation[i]["_compacted"] = True
+    message = {
+        "role": "user",
+        "content": f"{SUMMARY_PREFIX}\n\n{summary.text}",
+        "_summary": {"start": start, "end": end, "model": summary.model["model_title"]},
+    }
+    conversation.insert(indices[-1] + 1, message)
+    return message
+
+
+def describe(message: Dict[str, Any]) -> str:
+    """:return: Short description of a summary message for the UI"""
+    span = message["_summary"]
+    return f"messages {span['start'] + 1}-{span['end'] + 1} were summarized by {span['model']}"
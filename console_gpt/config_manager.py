@@ -1,6 +1,8 @@
+import copy
 import os
 import shutil
-from typing import Any, Dict, Iterable, List, Literal, Optional, Union
+import threading
+from typing import Any, Dict, Iterable, List, Literal, Optional, Tuple, Union
 
 import toml
 
@@ -89,15 +91,68 @@ CONFIG_VERSION_PATH_LOCAL = os.path.join(BASE_PATH, "app-data", "local_version.t
 CHATS_PATH = _join_and_check(BASE_PATH, "chats", create="folder")
 ASSISTANTS_PATH = _join_and_check(BASE_PATH, "assistants", create="folder")
 
+# Process-wide cache of the parsed config.toml. It is only re-parsed when the file's mtime/size changes.
+_config_cache: Dict[str, Any] = {"signature": None, "data": None}
+_config_lock = threading.RLock()
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """
+    Cheap fingerprint of a file used to detect changes without reading it
+    :param path: Path to the file
+    :return: (mtime in ns, size) or None if the file is missing
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _load_config() -> Dict:
+    """
+    Return the parsed config.toml from the cache, re-reading the file only if it changed on disk.
+    The returned dict is shared - never mutate it, copy it first.
+    :return: The data from the config file in dict format
+    """
+    with _config_lock:
+        signature = _file_signature(CONFIG_PATH)
+        if _config_cache["data"] is None or signature != _config_cache["signature"]:
+            _config_cache["data"] = _load_toml(CONFIG_PATH)
+            _config_cache["signature"] = signature
+        return _config_cache["data"]
+
 
 def write_to_config(*args, new_value: Any, group: bool = False) -> None:
     """
     Writes a new value to the config file
+    The file is replaced atomically and the in-memory cache is updated in the same step.
+    :param args: The keys to access the value in the config file
+    :param new_value: The new value to be written
+    :param group: Allow creating groups
+    """
+    with _config_lock:
+        config = copy.deepcopy(_load_config())
+        _set_config_value(config, args, new_value, group)
+
+        target_path = os.path.realpath(CONFIG_PATH)
+        tmp_path = f"{target_path}.tmp"
+        with open(tmp_path, "w") as file:
+            toml.dump(config, file)
+        os.replace(tmp_path, target_path)
+
+        _config_cache["data"] = config
+        _config_cache["signature"] = _file_signature(CONFIG_PATH)
+
+
+def _set_config_value(config: Dict, args: Tuple, new_value: Any, group: bool) -> None:
+    """
+    Supporting function for write_to_config() which applies the new value to the config dict
+    :param config: The config dict to modify in-place
     :param args: The keys to access the value in the config file
     :param new_value: The new value to be written
     :param group: Allow creating groups
     """
-    config = _load_toml(CONFIG_PATH)
     if group:
         config["chat"][args[0]] = {args[1]: new_value}
     match len(args):
@@ -112,28 +167,25 @@ def write_to_config(*args, new_value: Any, group: bool = False) -> None:
         case _:
             custom_print("error", "Wrong usage of write_to_config", 1)
 
-    with open(CONFIG_PATH, "w") as file:
-        toml.dump(config, file)
-
 
-def fetch_variable(*args, auto_exit: bool = True) -> Any:
+def fetch_variable(*args, auto_exit: bool = True, default: Any = None) -> Any:
     """
     Fetch variable from the config file (config.toml)
     By default the function is already looking into the "chat" group
     :param args: variable group/name as deep as necessary
     :param auto_exit: Automatically abort if var is missing
-    :return: Content or Error (with exit)
+    :param default: Value returned (instead of aborting) if var is missing, used for optional settings
+    :return: Content or Error (with exit), tables are shared with the cache and must not be modified
     """
-    config = _load_toml(CONFIG_PATH)
-    chat_var = config["chat"]
+    chat_var = _load_config()["chat"]
     try:
         match len(args):
             case 1:
-                return chat_var[args[0]]
+                value = chat_var[args[0]]
             case 2:
-                return chat_var[args[0]][args[1]]
+                value = chat_var[args[0]][args[1]]
             case 3:
-                return chat_var[args[0]][args[1]][args[2]]
+                value = chat_var[args[0]][args[1]][args[2]]
             case _:
                 custom_print(
                     "error",
@@ -142,7 +194,11 @@ def fetch_variable(*args, auto_exit: bool = True) -> Any:
                 )
 
     except KeyError:
+        if default is not None:
+            return default
         return __var_error(args, auto_exit)
+    # Tables are the cached objects themselves, callers which modify them (E.g. model_data.update()) copy them first
+    return value
 
 
 def __verify_local_version_config() -> None:
@@ -195,8 +251,12 @@ def __read_toml_structure(file_path) -> Dict:
 
     def get_structure(value):
         if isinstance(value, dict):
-            # Skip models and roles because everyone will have different roles and models
-            return {key: get_structure(val) for key, val in value.items() if key not in ["models", "roles"]}
+            # Skip models and roles because everyone will have different roles and models (and the rate limited providers)
+            return {
+                key: get_structure(val)
+                for key, val in value.items()
+                if key not in ["models", "roles", "requests_per_minute"]
+            }
             # return {key: get_structure(val) for key, val in value.items()}
         else:
             return type(value).__name__
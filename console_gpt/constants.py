@@ -2,9 +2,10 @@ from questionary import Style
 
 help_options = {
     "help": "Prints all available commands.",
-    # "cost": "Prints the costs of the current chat.",
+    "cost": "Prints the costs of the current chat, of today and of the last 30 days.",
     # "edit": "Prints the last prompt so you can edit it.",
     "tools": "List all active tools.",
+    "continue": "Resumes the last reply if it was interrupted.",
     "exit": "Exits the chat.",
     "file": "Allows you to upload a TXT or PDF file content to the chat.",
     "image": "Allows you to upload an image [Supported by openai API based and anthropic models].",
@@ -12,6 +13,7 @@ help_options = {
     "format": "Allows you to write multiline messages.",
     "save": "Saves the chat to a given file.",
     "chats": "Manage chats",
+    "search": "Search the saved chats by their content, then read or continue one of them.",
     "settings": "Manage available features.",
     "browser": "Scrapes a given page and use the content as input.",
 }
@@ -0,0 +1,285 @@
+import json
+import os
+import secrets
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterator, NamedTuple, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from rich.console import Console
+from rich.table import Table
+
+from console_gpt.config_manager import BASE_PATH, _file_signature, fetch_variable
+from console_gpt.custom_stdout import custom_print
+
+"""
+Cost tracking - usage of every request priced with the model data and aggregated in a local ledger
+"""
+
+LEDGER_PATH = os.path.join(BASE_PATH, "app-data", "cost_ledger.json")
+# Summed up per day/chat and model
+TOTAL_FIELDS = (
+    "requests",
+    "input_tokens",
+    "output_tokens",
+    "cache_read_tokens",
+    "cache_write_tokens",
+    "cost",
+    "latency",
+)
+
+
+class Usage(NamedTuple):
+    input_tokens: int  # Input tokens billed at the full price (without the cached ones)
+    output_tokens: int
+    cache_read_tokens: int = 0
+    cache_write_tokens: int = 0
+    estimated: bool = False  # The provider didn't report the usage, it was counted locally
+    cache_reported: bool = False  # The provider reported the cached tokens (E.g. unichat drops them for Anthropic)
+
+
+def _value(obj: Any, name: str) -> Any:
+    """Supporting function for usage_from_response(), usage blocks are objects or dicts depending on the provider"""
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+
+def usage_from_response(usage: Any) -> Optional[Usage]:
+    """
+    Normalize the usage block of a response (or of the last stream chunk) from any provider
+    OpenAI style blocks include the cached tokens in prompt_tokens, Anthropic style ones report them apart.
+    :param usage: The usage block
+    :return: The usage or None if the block is missing
+    """
+    if usage is None:
+        return None
+
+    def field(obj: Any, *names: str) -> int:
+        values = [_value(obj, name) for name in names] if obj is not None else []
+        return next((int(value) for value in values if isinstance(value, (int, float))), 0)
+
+    details = _value(usage, "prompt_tokens_details")
+    openai_cached = field(details, "cached_tokens")
+    cache_fields = ("cache_read_input_tokens", "cache_creation_input_tokens")
+    return Usage(
+        input_tokens=max(field(usage, "prompt_tokens", "input_tokens") - openai_cached, 0),
+        output_tokens=field(usage, "completion_tokens", "output_tokens"),
+        cache_read_tokens=field(usage, "cache_read_input_tokens") + openai_cached,
+        cache_write_tokens=field(usage, "cache_creation_input_tokens"),
+        cache_reported=any(_value(usage, name) is not None for name in cache_fields)
+        or (details is not None and _value(details, "cached_tokens") is not None),
+    )
+
+
+def usage_cost(usage: Usage, model: Dict[str, Any]) -> float:
+    """
+    :param usage: Usage of a request
+    :param model: The model data (model_input_pricing_per_1k, model_output_pricing_per_1k)
+    :return: Price of the request in USD
+    """
+    input_price = model.get("model_input_pricing_per_1k", 0) / 1000
+    output_price = model.get("model_output_pricing_per_1k", 0) / 1000
+    return (
+        usage.input_tokens * input_price
+        + usage.cache_read_tokens * input_price * fetch_variable("cost", "cache_read_multiplier", default=0.1)
+        + usage.cache_write_tokens * input_price * fetch_variable("cost", "cache_write_multiplier", default=1.25)
+        + usage.output_tokens * output_price
+    )
+
+
+@contextmanager
+def _file_lock(path: str) -> Iterator[None]:
+    """
+    Supporting function for CostLedger, holds an exclusive lock on the file across processes
+    :param path: The lock file (created if missing)
+    """
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)  # Retries for 10 seconds, then raises OSError
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class CostLedger:
+    """
+    Aggregated usage per day and model and per chat and model, kept as one small JSON file.
+    Single requests aren't stored, so the ledger stays compact no matter how long it's used. Updates are made under a
+    lock file, so instances running at the same time don't drop each other's requests.
+    """
+
+    _instance: Optional["CostLedger"] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, path: str = LEDGER_PATH) -> None:
+        self.path = path
+        self.last_chat: Optional[str] = None  # Chat of the latest request of this process
+        self._lock = threading.Lock()
+        self._signature = None
+        self._data = {"days": {}, "chats": {}}
+
+    @classmethod
+    def shared(cls) -> "CostLedger":
+        """:return: The ledger of this process"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def _load(self, force: bool = False) -> None:
+        """
+        Supporting function, re-reads the file if another process changed it
+        :param force: Read it even if it looks unchanged (a change within the same mtime tick keeps the signature)
+        """
+        signature = _file_signature(self.path)
+        if signature == self._signature and not force:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._data = json.load(f)
+        except (OSError, ValueError):
+            self._data = {"days": {}, "chats": {}}
+        self._signature = signature
+
+    def _save(self) -> None:
+        """Supporting function, replaces the file atomically."""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._data, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+        self._signature = _file_signature(self.path)
+
+    def record(
+        self, chat_id: str, model_title: str, usage: Usage, cost: float, latency: float, cached: bool = False
+    ) -> None:
+        """
+        Add a request to the ledger
+        :param chat_id: The chat (or batch run) which sent the request
+        :param model_title: Key of the model in [chat.models]
+        :param usage: Usage of the request
+        :param cost: Price of the request in USD
+        :param latency: Seconds until the reply was complete
+        :param cached: The request used the prompt cache, counted as a hit if any input was read from it
+        (only if the provider reported the cached tokens, there's no telling a hit from a miss otherwise)
+        """
+        tokens = (usage.input_tokens, usage.output_tokens, usage.cache_read_tokens, usage.cache_write_tokens)
+        values = dict(zip(TOTAL_FIELDS, (1, *tokens, round(cost, 8), round(latency, 3))))
+        if cached and usage.cache_reported and not usage.estimated:
+            values["cache_hits" if usage.cache_read_tokens else "cache_misses"] = 1
+        with self._lock:
+            self.last_chat = chat_id
+            try:
+                with _file_lock(f"{self.path}.lock"):
+                    self._load(force=True)
+                    for scope, key in (("days", date.today().isoformat()), ("chats", chat_id)):
+                        totals = self._data[scope].setdefault(key, {}).setdefault(model_title, {})
+                        for field, value in values.items():
+                            totals[field] = round(totals.get(field, 0) + value, 8)
+                        if usage.estimated:
+                            totals["estimated"] = totals.get("estimated", 0) + 1
+                    self._save()
+            except OSError as e:
+                custom_print("warn", f"Could not update the cost ledger: {e}")
+
+    def totals(self, scope: str, keys: Optional[set] = None) -> Dict[str, Dict[str, float]]:
+        """
+        :param scope: "days" or "chats"
+        :param keys: Only these days/chats (all if None)
+        :return: The totals of each model
+        """
+        result: Dict[str, Dict[str, float]] = {}
+        with self._lock:
+            self._load()
+            for key, models in self._data[scope].items():
+                if keys is not None and key not in keys:
+                    continue
+                for model_title, totals in models.items():
+                    merged = result.setdefault(model_title, {})
+                    for field, value in totals.items():
+                        merged[field] = merged.get(field, 0) + value
+        return result
+
+
+def record_usage(chat_id: str, model: Dict[str, Any], usage: Usage, latency: float, cached: bool = False) -> float:
+    """
+    Price a request and add it to the ledger
+    :param chat_id: The chat (or batch run) which sent the request
+    :param model: The model data (incl. model_title)
+    :param usage: Usage of the request
+    :param latency: Seconds until the reply was complete
+    :param cached: The request used the prompt cache
+    :return: Price of the request in USD
+    """
+    cost = usage_cost(usage, model)
+    CostLedger.shared().record(chat_id, model["model_title"], usage, cost, latency, cached)
+    return cost
+
+
+def _totals_table(title: str, totals: Dict[str, Dict[str, float]]) -> Table:
+    """Supporting function for cost_report()"""
+    table = Table(title=title, title_justify="left", title_style="bold")
+    columns = ("Model", "Requests", "Input", "Output", "Cache read", "Cache write", "Cache hits", "Avg latency", "Cost")
+    for column in columns:
+        table.add_column(column, justify="left" if column == "Model" else "right")
+    for model_title, row in sorted(totals.items(), key=lambda item: -item[1].get("cost", 0)):
+        requests = row.get("requests", 0)
+        estimated = " *" if row.get("estimated") else ""
+        cached_requests = row.get("cache_hits", 0) + row.get("cache_misses", 0)
+        table.add_row(
+            model_title + estimated,
+            f"{requests:,}",
+            f"{row.get('input_tokens', 0):,}",
+            f"{row.get('output_tokens', 0):,}",
+            f"{row.get('cache_read_tokens', 0):,}",
+            f"{row.get('cache_write_tokens', 0):,}",
+            f"{row.get('cache_hits', 0)}/{cached_requests}" if cached_requests else "-",
+            f"{row.get('latency', 0) / requests:.1f}s" if requests else "-",
+            f"${row.get('cost', 0):.4f}",
+        )
+    if len(totals) > 1:
+        table.add_row("Total", *[""] * (len(columns) - 2), f"${sum(row.get('cost', 0) for row in totals.values()):.4f}")
+    return table
+
+
+def cost_report(days: int = 30) -> None:
+    """
+    Print the costs of the current chat, of today and of the last days per model
+    :param days: Days covered by the last table
+    :return: Nothing, just prints
+    """
+    console = Console()
+    ledger = CostLedger.shared()
+    today = date.today()
+    sections = [
+        ("Today", ledger.totals("days", {today.isoformat()})),
+        (f"Last {days} days", ledger.totals("days", {(today - timedelta(days=n)).isoformat() for n in range(days)})),
+    ]
+    if ledger.last_chat:
+        sections.insert(0, ("This chat", ledger.totals("chats", {ledger.last_chat})))
+
+    if not any(totals for _, totals in sections):
+        custom_print("info", "No costs recorded yet.")
+        return
+    for title, totals in sections:
+        if totals:
+            console.print(_totals_table(title, totals))
+    if any(row.get("estimated") for _, totals in sections for row in totals.values()):
+        console.print("* Some usage wasn't reported by the provider (E.g. streamed replies) and was estimated locally.")
+
+
+def new_chat_id(prefix: str = "chat") -> str:
+    """:return: Unique id for the ledger, the default name of saved chats followed by a random suffix"""
+    return f"{prefix}_{datetime.now().strftime('%Y_%m_%d_%H%M%S')}_{secrets.token_hex(3)}"
@@ -1,6 +1,9 @@
-from typing import Literal, Optional
+import re
+import threading
+import time
+from typing import Iterable, List, Literal, Optional
 
-from rich.console import Console
+from rich.console import Console, Group, RenderableType
 from rich.live import Live
 from rich.markdown import Markdown
 from rich.text import Text
@@ -27,15 +30,149 @@ def markdown_print(
     console.print(markdown, width=console.width)
 
 
-def markdown_stream(chunks):
-    console = Console()
-    response = ""
-    with Live(console=console, refresh_per_second=10, vertical_overflow="ellipsis") as live:
+# Opening/closing line of a fenced code block (at most 3 spaces of indentation)
+FENCE_PATTERN = re.compile(r"^( {0,3})(`{3,}|~{3,})")
+
+# Bounds of the adaptive interval between two frames of the streaming display (seconds)
+MIN_FRAME_INTERVAL = 1 / 30
+MAX_FRAME_INTERVAL = 1 / 2
+# Share of the time the streaming display may spend drawing
+RENDER_BUDGET = 0.25
+
+
+class MarkdownStream:
+    """
+    Render streamed Markdown at a constant cost per chunk.
+    Completed blocks (paragraphs followed by a blank line, closed code fences) are printed once above the
+    live area and never parsed again - only the open tail block is re-rendered when new text arrives.
+    Frames are drawn by a background thread which coalesces all chunks received in between and stretches
+    the frame interval when the terminal is slow to draw, so the reader never throttles the stream.
+    In raw mode (or when stdout isn't a terminal) the text is written as-is, without any rendering.
+    """
+
+    def __init__(self, console: Optional[Console] = None, raw: bool = False, **live_options) -> None:
+        self.console = console or Console()
+        self.raw = raw or not self.console.is_terminal
+        self._chunks: List[str] = []  # Everything written so far
+        self._block: List[str] = []  # Complete lines of the open block
+        self._line: List[str] = []  # Chunks of the unfinished last line
+        self._fence: Optional[str] = None  # Marker of the open code fence
+        self._after_blank = False
+        self._frozen = False  # Whether any block has been printed
+        self._dirty = False  # New text since the last frame
+        self._tail: RenderableType = Text("")
+        self._done = threading.Event()
+        self._frames: Optional[threading.Thread] = None
+        self.live = Live(console=self.console, auto_refresh=False, get_renderable=self._render_tail, **live_options)
+
+    def __enter__(self) -> "MarkdownStream":
+        if not self.raw:
+            self.live.__enter__()
+            self._frames = threading.Thread(target=self._draw_frames, name="markdown-stream", daemon=True)
+            self._frames.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if self.raw:
+            if self._chunks and not self._chunks[-1].endswith("\n"):
+                self.console.file.write("\n")
+            self.console.file.flush()
+            return
+        self._done.set()
+        self._frames.join()
+        self._dirty = True
+        self.live.__exit__(exc_type, exc_val, exc_tb)  # Draws the final frame
+
+    def _draw_frames(self) -> None:
+        """Redraw the live area when new text arrived, backing off while the terminal is slow to draw."""
+        interval = MIN_FRAME_INTERVAL
+        while not self._done.wait(interval):
+            if not self._dirty:
+                continue
+            started = time.perf_counter()
+            self.live.refresh()
+            elapsed = time.perf_counter() - started
+            interval = min(MAX_FRAME_INTERVAL, max(MIN_FRAME_INTERVAL, elapsed / RENDER_BUDGET))
+
+    @property
+    def text(self) -> str:
+        """Everything written so far."""
+        return "".join(self._chunks)
+
+    def write(self, chunk: str) -> None:
+        """Append streamed text, freezing the blocks it completes."""
+        if not chunk:
+            return
+        self._chunks.append(chunk)
+        if self.raw:
+            self.console.file.write(chunk)
+            self.console.file.flush()
+            return
+        self._line.append(chunk)
+        if "\n" in chunk:
+            *lines, rest = "".join(self._line).split("\n")
+            self._line = [rest] if rest else []
+            for line in lines:
+                self._add_line(line)
+        self._dirty = True
+
+    def _add_line(self, line: str) -> None:
+        """Supporting function for write(), decides whether the line completes a block."""
+        fence = FENCE_PATTERN.match(line)
+        if self._fence:
+            self._block.append(line)
+            closing = fence and fence.group(2)[0] == self._fence[0] and len(fence.group(2)) >= len(self._fence)
+            if closing and not line[len(fence.group(0)) :].strip():
+                self._fence = None
+                if not fence.group(1):
+                    self._freeze()
+            return
+
+        if not line.strip():
+            self._block.append(line)
+            self._after_blank = True
+            return
+
+        # A new unindented block after a blank line - indented lines may still continue a list item
+        if self._after_blank and not line[0].isspace():
+            self._freeze()
+        self._after_blank = False
+        if fence:
+            self._fence = fence.group(2)
+        self._block.append(line)
+
+    def _freeze(self) -> None:
+        """Print the open block above the live area, it's never rendered again."""
+        block = "\n".join(self._block).strip("\n")
+        self._block = []
+        self._after_blank = False
+        if not block:
+            return
+        # Drop the block from the live area before it's printed above it
+        self._dirty = True
+        self.live.refresh()
+        if self._frozen:
+            self.live.console.print()
+        self.live.console.print(Markdown(block, code_theme="dracula"))
+        self._frozen = True
+
+    def _render_tail(self) -> RenderableType:
+        """Renders only the open block, and only if text arrived since the last frame."""
+        if not self._dirty:
+            return self._tail
+        self._dirty = False
+        tail = "\n".join(self._block + ["".join(self._line)]).strip("\n")
+        markdown = Markdown(tail, code_theme="dracula")
+        # Keep the blank line which separates the tail from the printed blocks
+        self._tail = Group(Text(""), markdown) if self._frozen and tail else markdown
+        return self._tail
+
+
+def markdown_stream(chunks: Iterable[str], raw: bool = False) -> str:
+    with MarkdownStream(raw=raw, vertical_overflow="ellipsis") as stream:
         for chunk in chunks:
-            response += chunk
-            md = Markdown(response, code_theme="dracula")
-            live.update(md)
-    return response
+            stream.write(chunk)
+    return stream.text
 
 
 def custom_print(
@@ -0,0 +1,134 @@
+import hashlib
+import io
+import json
+import math
+import os
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+from console_gpt.attachment_store import ATTACHMENTS_PATH, attachment_exists, store_image
+from console_gpt.config_manager import fetch_variable
+
+"""
+Image preprocessing - scales uploads down to what the provider actually uses and re-encodes them
+A provider downsizes bigger images anyway, so sending them at full size only costs upload time and latency.
+"""
+
+# Processed images by the hash of their source and the settings, pointing to the attachment store
+PROCESSED_PATH = os.path.join(ATTACHMENTS_PATH, "processed")
+# Formats every provider accepts, images in another format are always re-encoded
+SUPPORTED_FORMATS = {"JPEG", "PNG", "WEBP", "GIF"}
+
+
+class ImageLimits(NamedTuple):
+    long_edge: int  # Pixels of the longer side
+    short_edge: Optional[int] = None  # Pixels of the shorter side
+    max_pixels: Optional[int] = None  # Width times height
+
+
+# Largest resolution each provider processes (bigger images are scaled down on their side), by model key prefix
+PROVIDER_LIMITS = {
+    ("anthropic",): ImageLimits(1568, max_pixels=1_150_000),
+    ("gpt", "o1", "o3", "o4", "chatgpt"): ImageLimits(2048, short_edge=768),
+    ("gemini",): ImageLimits(3072),
+    ("mistral", "pixtral"): ImageLimits(1024),
+}
+DEFAULT_LIMITS = ImageLimits(2048)
+
+
+def limits_for(model_title: str) -> ImageLimits:
+    """
+    :param model_title: Key of the model in [chat.models]
+    :return: The largest useful resolution for the model's provider
+    """
+    title = model_title.lower()
+    return next(
+        (limits for prefixes, limits in PROVIDER_LIMITS.items() if title.startswith(prefixes)),
+        DEFAULT_LIMITS,
+    )
+
+
+def _scale(size: Tuple[int, int], limits: ImageLimits) -> float:
+    """Supporting function for prepare_image(), the factor which fits the image into the limits (at most 1)."""
+    width, height = size
+    factors = [1.0, limits.long_edge / max(width, height)]
+    if limits.short_edge:
+        factors.append(limits.short_edge / min(width, height))
+    if limits.max_pixels:
+        factors.append(math.sqrt(limits.max_pixels / (width * height)))
+    return min(factors)
+
+
+def _target_format() -> str:
+    """Supporting function, the format of [chat.images] as known to Pillow (JPEG if it isn't supported)."""
+    image_format = fetch_variable("images", "format", default="jpeg").upper().replace("JPG", "JPEG")
+    return image_format if image_format in SUPPORTED_FORMATS - {"GIF"} else "JPEG"
+
+
+def _encode(image: Image.Image, image_format: str, quality: int) -> bytes:
+    """Supporting function for prepare_image(), the image in the given format (JPEG loses the transparency)."""
+    if image_format == "JPEG" and image.mode != "RGB":
+        rgba = image.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        image = background
+    elif image.mode not in ("RGB", "RGBA", "L", "LA"):
+        image = image.convert("RGBA")
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def prepare_image(data: bytes, limits: ImageLimits) -> Tuple[bytes, str]:
+    """
+    Scale an image down to the limits and re-encode it, the original is kept if that's smaller
+    :param data: The image file
+    :param limits: The resolution limits of the provider
+    :return: The image to send and its MIME type
+    :raises OSError: If the data isn't a readable image
+    """
+    image_format = _target_format()
+    quality = fetch_variable("images", "quality", default=85)
+    with Image.open(io.BytesIO(data)) as source:
+        source_format = source.format
+        image = ImageOps.exif_transpose(source)  # Phone photos are often stored sideways with a rotation tag
+        scale = _scale(image.size, limits)
+        if scale < 1:
+            size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+            image = image.resize(size, Image.LANCZOS)
+        encoded = _encode(image, image_format, quality)
+
+    if scale >= 1 and source_format in SUPPORTED_FORMATS and len(data) <= len(encoded):
+        return data, Image.MIME[source_format]
+    return encoded, Image.MIME[image_format]
+
+
+def process_image(data: bytes, model_title: str) -> Dict[str, str]:
+    """
+    Prepare an image for the model and add it to the attachment store, prepared images are cached by their source
+    :param data: The image file
+    :param model_title: Key of the model in [chat.models]
+    :return: The reference part for the content of a message
+    """
+    if not fetch_variable("images", "preprocess", default=True):
+        with Image.open(io.BytesIO(data)) as source:
+            return store_image(data, Image.MIME.get(source.format, "image/jpeg"))
+
+    limits = limits_for(model_title)
+    settings = (limits, _target_format(), fetch_variable("images", "quality", default=85))
+    key = hashlib.sha256(data + repr(settings).encode("utf-8")).hexdigest()
+    cache_path = os.path.join(PROCESSED_PATH, key)
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            ref = json.load(f)
+        if attachment_exists(ref["sha256"]):
+            return ref
+    except (OSError, ValueError, KeyError):
+        pass
+
+    ref = store_image(*prepare_image(data, limits))
+    os.makedirs(PROCESSED_PATH, exist_ok=True)
+    with open(cache_path, "w", encoding="utf-8") as f:
+        json.dump(ref, f)
+    return ref
@@ -60,7 +60,7 @@ def managed_prompt() -> Tuple[ChatObject, str]:
     """
     assistant = configure_assistant()
     model_name, system_prompt, user_prompt = get_model_and_prompts_based_on_conversation(assistant)
-    model_data = fetch_variable("models", model_name)
+    model_data = dict(fetch_variable("models", model_name))
     model_data.update(dict(model_title=model_name))
     model_data = update_api_key_if_placeholder(model_data)
     temperature = temperature_prompt()
@@ -71,7 +71,7 @@ def managed_prompt() -> Tuple[ChatObject, str]:
 def configure_assistant():
     assistant_model = fetch_variable("defaults", "assistant")
     assistant_role = fetch_variable("defaults", "assistant_role")
-    model_data = fetch_variable("models", assistant_model)
+    model_data = dict(fetch_variable("models", assistant_model))
     model_data.update(dict(model_title=assistant_model))
     model_data.update(dict(role=assistant_role))
     model_data = update_api_key_if_placeholder(model_data)
@@ -136,7 +136,7 @@ def command_catcher(assistant):
             assistant["model_title"], assistant["model_name"], prompt[0]["content"], prompt, False, []
         )
         match handled_prompt:
-            case "continue" | None:
+            case "continue" | "switched" | None:
                 continue
             case "break":
                 exit(1)
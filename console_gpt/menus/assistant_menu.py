@@ -11,7 +11,7 @@ from unichat.api_helper import openai
 from console_gpt.config_manager import (ASSISTANTS_PATH, fetch_variable,
                                         write_to_config)
 from console_gpt.custom_stdin import custom_input
-from console_gpt.custom_stdout import custom_print, markdown_print
+from console_gpt.custom_stdout import custom_print
 from console_gpt.general_utils import capitalize, decapitalize
 from console_gpt.menus.role_menu import _add_custom_role, role_menu
 from console_gpt.menus.skeleton_menus import (base_checkbox_menu,
@@ -19,6 +19,7 @@ from console_gpt.menus.skeleton_menus import (base_checkbox_menu,
                                               base_settings_menu)
 from console_gpt.menus.tools_menu import transform_tools_selection
 from console_gpt.prompts.save_chat_prompt import _validate_confirmation
+from console_gpt.tool_executor import ToolCall, execute_tool_calls
 from mcp_servers.mcp_tcp_client import MCPClient
 
 TIMEOUT = 300
@@ -239,8 +240,8 @@ def _edit_tools(model, assistant):
 def _select_assistant_tools():
     try:
         if fetch_variable("features", "mcp_client"):
-            with MCPClient() as mcp:
-                tools = mcp.get_available_tools()
+            mcp = MCPClient.session()
+            tools = mcp.get_available_tools() if mcp is not None else []
         else:
             tools = []
     except Exception as e:
@@ -425,22 +426,19 @@ def run_thread(client, assistant_id, thread_id):
             run = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id)
             match run.status:
                 case "requires_action":
-                    tool_outputs = []
-                    for tool in run.required_action.submit_tool_outputs.tool_calls:
-                        try:
-                            markdown_print(f"> Triggered: `{tool.function.name}`.")
-                            with MCPClient() as mcp:
-                                tool_outputs.append(
-                                    {
-                                        "tool_call_id": tool.id,
-                                        "output": str(
-                                            mcp.call_tool(tool.function.name, json.loads(tool.function.arguments))
-                                        ),
-                                    }
-                                )
-                        except Exception as e:
-                            run = client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run.id)
-                            raise
+                    results = execute_tool_calls(
+                        [
+                            ToolCall(tool.id, tool.function.name, tool.function.arguments)
+                            for tool in run.required_action.submit_tool_outputs.tool_calls
+                        ]
+                    )
+                    failed = next((result for result in results if result.failed), None)
+                    if failed:
+                        run = client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run.id)
+                        raise RuntimeError(failed.content)
+                    tool_outputs = [
+                        {"tool_call_id": result.tool_call_id, "output": result.content} for result in results
+                    ]
                     if tool_outputs:
                         try:
                             run = client.beta.threads.runs.submit_tool_outputs_and_poll(
@@ -1,7 +1,7 @@
 import json
 import os
 import shutil
-from typing import Union
+from typing import Dict, List, Optional, Union
 
 from rich.console import Console
 from rich.markdown import Markdown
@@ -10,7 +10,10 @@ from rich.panel import Panel
 from rich.style import Style
 from rich.theme import Theme
 
-from console_gpt.config_manager import CHATS_PATH
+from console_gpt.attachment_store import externalize
+from console_gpt.chat_index import ChatIndex, chat_preview
+from console_gpt.chat_journal import CHAT_SUFFIXES, JOURNAL_SUFFIX, load_chat
+from console_gpt.config_manager import CHATS_PATH, fetch_variable
 from console_gpt.constants import style
 from console_gpt.custom_stdin import custom_input
 from console_gpt.custom_stdout import custom_print
@@ -30,11 +33,11 @@ def _chat_exists(path_to_file: str) -> Union[str, bool]:
     :param path_to_file: Path to file
     :return: Either an error message or True represented as string for compatibility
     """
-    if path_to_file.endswith(".json"):
+    if path_to_file.endswith(CHAT_SUFFIXES):
         if os.path.exists(os.path.join(CHATS_PATH, path_to_file)):
-            return f"Chat with the name {path_to_file.strip('.json')} already exists!"
+            return f"Chat with the name {path_to_file} already exists!"
     else:
-        if os.path.exists(os.path.join(CHATS_PATH, f"{path_to_file}.json")):
+        if any(os.path.exists(os.path.join(CHATS_PATH, path_to_file + suffix)) for suffix in CHAT_SUFFIXES):
             return f"Chat with the name {path_to_file} already exists!"
     return True
 
@@ -47,8 +50,7 @@ def _is_chat(path_to_file: str) -> Union[str, bool]:
     """
     if os.path.isfile(path_to_file):
         try:
-            with open(path_to_file, "r") as file:
-                _ = json.load(file)
+            _ = load_chat(path_to_file)
             return True
         except json.JSONDecodeError as e:
             return f"Unable to parse chat due to: {str(e)}"
@@ -87,8 +89,9 @@ def _import_chats() -> None:
         system_reply("No chat selected.")
         return None
 
-    if not copy_filename.endswith(".json"):
-        copy_filename = copy_filename + ".json"
+    if not copy_filename.endswith(CHAT_SUFFIXES):
+        # Keep the format of the imported chat (a journal or a classic .json)
+        copy_filename = copy_filename + (JOURNAL_SUFFIX if chat_path.endswith(JOURNAL_SUFFIX) else ".json")
 
     shutil.copy2(chat_path, os.path.join(CHATS_PATH, copy_filename))
     custom_print("ok", f"Chat {copy_filename} successfully imported!")
@@ -111,10 +114,15 @@ def _delete_chats(available_chats) -> None:
 
     for chat in chats_selection:
         os.remove(os.path.join(CHATS_PATH, chat))
+        ChatIndex.shared().remove(chat)
         custom_print("ok", f"Successfully deleted chat - {chat}")
 
 
-def _read_chat(available_chats) -> None:
+def _show_chat(chat_selection: str) -> None:
+    """
+    Show a saved chat in the pager
+    :param chat_selection: File name of the chat in CHATS_PATH
+    """
     # Constants for markdown templates
     MD_TEMPLATES = {
         "system": "🤖 **System Message**:\n{}\n\n---\n\n",
@@ -132,21 +140,7 @@ def _read_chat(available_chats) -> None:
     )
 
     try:
-        if not available_chats:
-            system_reply("No available chats!")
-            return
-
-        available_chats.append("Return")
-        chat_selection = base_multiselect_menu(
-            "Chats", available_chats, "Select a chat to read:", exit=False, allow_none=True
-        )
-
-        if chat_selection in ("Return", None):
-            return
-
-        chat_path = os.path.join(CHATS_PATH, chat_selection)
-        with open(chat_path, "r") as f:
-            chat_data = json.load(f)
+        chat_data = load_chat(os.path.join(CHATS_PATH, chat_selection))
 
         help_box = Panel(
             "Press 'q' to exit\nUse ↑/↓ or Page Up/Down to scroll",
@@ -185,10 +179,94 @@ def _read_chat(available_chats) -> None:
         system_reply(f"Error reading chat: {str(e)}")
 
 
-def chat_manager() -> None:
-    available_chats = os.listdir(CHATS_PATH)
+def _read_chat(available_chats, previews=None) -> None:
+    if not available_chats:
+        system_reply("No available chats!")
+        return
+
+    available_chats.append("Return")
+    chat_selection = base_multiselect_menu(
+        "Chats",
+        available_chats,
+        "Select a chat to read:",
+        exit=False,
+        allow_none=True,
+        preview_command=(lambda item: previews.get(item, "")) if previews else None,
+        preview_size=0.4,
+    )
+
+    if chat_selection in ("Return", None):
+        return
+    _show_chat(chat_selection)
+
+
+def search_chats(query: Optional[str] = None) -> Optional[List[Dict]]:
+    """
+    Find saved chats by their content, then read or continue one of them
+    :param query: The words to look for, asked for if not given
+    :return: The conversation of the chat to continue, None otherwise
+    """
+    if query is None:
+        query = custom_input(message="Search the saved chats for:", qmark="❯", style=style)
+    if not query or not query.strip():
+        system_reply("Nothing to search for.")
+        return None
+
+    index = ChatIndex.shared()
+    chats = {info.name: info for info in index.refresh()}
+    hits = index.search(query, limit=fetch_variable("search", "max_results", default=20))
+    if not hits:
+        system_reply(f"No saved chat mentions '{query}'.")
+        return None
+
+    # "|" separates the entry from its preview data in the menu
+    entries = [f"{hit.name} - {' '.join(hit.snippet.split())}".replace("|", "/")[:120] for hit in hits]
+    previews = {
+        entry: f"{chat_preview(chats[hit.name]) if hit.name in chats else hit.name}\n\n"
+        f"Message {hit.position + 1} ({hit.role}):\n{hit.snippet}"
+        for entry, hit in zip(entries, hits)
+    }
+    selection = base_multiselect_menu(
+        "Search results",
+        entries + ["Return"],
+        f"{len(hits)} chats mention '{query}', the best matches first:",
+        exit=False,
+        allow_none=True,
+        preview_command=lambda item: previews.get(item, ""),
+        preview_size=0.4,
+    )
+    if selection in ("Return", None):
+        return None
+
+    chat_name = hits[entries.index(selection)].name
+    action = base_multiselect_menu(
+        "Search result actions",
+        ["Read", "Continue", "Return"],
+        f"{chat_name}:",
+        exit=False,
+        allow_none=True,
+    )
+    match action:
+        case "Read":
+            _show_chat(chat_name)
+        case "Continue":
+            try:
+                return externalize(load_chat(os.path.join(CHATS_PATH, chat_name)))
+            except (OSError, json.JSONDecodeError) as e:
+                custom_print("error", f"Failed to load {chat_name}: {e}")
+    return None
+
+
+def chat_manager() -> Optional[List[Dict]]:
+    """
+    Manage the saved chats
+    :return: The conversation of a chat to continue (found by a search), None otherwise
+    """
+    chats = ChatIndex.shared().refresh()
+    available_chats = [info.name for info in chats]
+    previews = {info.name: chat_preview(info) for info in chats}
     if available_chats:
-        selections = ["Read Existing Chat", "Sync External Chat", "Delete", "Return"]
+        selections = ["Read Existing Chat", "Search Chats", "Sync External Chat", "Delete", "Return"]
     else:
         selections = ["Sync External Chat", "Return"]
     selection = base_multiselect_menu(
@@ -201,7 +279,9 @@ def chat_manager() -> None:
 
     match selection:
         case "Read Existing Chat":
-            _read_chat(available_chats)
+            _read_chat(available_chats, previews)
+        case "Search Chats":
+            return search_chats()
         case "Sync External Chat":
             _import_chats()
         case "Delete":
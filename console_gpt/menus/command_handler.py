@@ -1,8 +1,10 @@
 from typing import Optional
 
+from console_gpt.chat_journal import ChatJournal
+from console_gpt.cost_tracker import cost_report
 from console_gpt.custom_stdout import custom_print, markdown_print
 from console_gpt.general_utils import help_message
-from console_gpt.menus.chat_manager import chat_manager
+from console_gpt.menus.chat_manager import chat_manager, search_chats
 from console_gpt.menus.settings_menu import settings_menu
 from console_gpt.menus.tools_menu import tools_menu
 from console_gpt.prompts.file_prompt import file_prompt
@@ -13,6 +15,21 @@ from console_gpt.prompts.url_prompt import additional_info, input_url
 from console_gpt.scrape_page import page_content
 
 
+def _switch_chat(conversation, found_chat, model_title) -> str:
+    """
+    Continue a saved chat in place of the current one (offering to save the current one first)
+    :param conversation: The current conversation, replaced in place
+    :param found_chat: The conversation of the saved chat
+    :param model_title: Key of the current model
+    :return: Hint for the caller function loop ("switched", the chat needs a new engine)
+    """
+    save_chat(conversation, ask=True, skip_exit=True)
+    conversation[:] = found_chat
+    ChatJournal.start(conversation, model_title)
+    custom_print("ok", f"Continuing the selected chat ({len(conversation)} messages).")
+    return "switched"
+
+
 def command_handler(model_title, model_name, user_input, conversation, cached, tools) -> Optional[str]:
     """
     Handled specific keywords as features if entered by the user
@@ -24,8 +41,12 @@ def command_handler(model_title, model_name, user_input, conversation, cached, t
             help_message()
             return "continue"
         case "cost":
-            custom_print("warn", "Cost calculation is not yet implemented")
+            cost_report()
             return "continue"
+        case "continue":
+            if not conversation or not conversation[-1].get("_truncated"):
+                return user_input  # Nothing was interrupted, so it's a normal prompt
+            return "resume"
         case "edit":
             custom_print("warn", "Edit last message is not yet implemented")
             return "continue"
@@ -70,7 +91,14 @@ def command_handler(model_title, model_name, user_input, conversation, cached, t
             save_chat(conversation, ask=True, skip_exit=True)
             return "break"
         case "chats":
-            chat_manager()
+            found_chat = chat_manager()
+            if found_chat is not None:
+                return _switch_chat(conversation, found_chat, model_title)
+            return "continue"
+        case "search":
+            found_chat = search_chats()
+            if found_chat is not None:
+                return _switch_chat(conversation, found_chat, model_title)
             return "continue"
         case "settings":
             settings_menu()
@@ -101,18 +129,9 @@ def command_handler(model_title, model_name, user_input, conversation, cached, t
                     f"Cannot upload images unless you're using vision supported model. Current model: {model_name}!",
                 )
                 return "continue"
-            if model_title.lower().startswith("anthropic") and cached is True:
-                custom_print(
-                    "error",
-                    f"Cannot upload images into Anthropic Prompt Cache",
-                )
-                return "continue"
             return upload_image(model_title)
         case "exit" | "quit" | "bye":
             save_chat(conversation, ask=True)
 
         case _:
-            if cached is True:
-                return user_input, str(cached)
-            else:
-                return user_input
+            return user_input
@@ -29,7 +29,7 @@ def model_menu() -> Dict[str, Union[int, str, float]]:
         _show_menu = True
 
     if not _show_menu:
-        model_data = all_models[default_model]
+        model_data = dict(all_models[default_model])
         model_data.update(dict(model_title=default_model))
         return model_data
 
@@ -54,6 +54,6 @@ def model_menu() -> Dict[str, Union[int, str, float]]:
             custom_print("info", "No models found in Ollama. Please check the Ollama server or select another model.")
             model_menu()
     else:
-        model_data = all_models[selection]
+        model_data = dict(all_models[selection])
     model_data.update(dict(model_title=selection))
     return model_data
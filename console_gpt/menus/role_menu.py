@@ -75,7 +75,7 @@ def _remove_custom_role() -> None:
     Sub-function to role_menu() which allows removing existing roles
     :return: Nothing, just write to the config.
     """
-    roles_data = fetch_variable("roles")
+    roles_data = dict(fetch_variable("roles"))
     roles_names = roles_data.keys()
     removed_roles = base_checkbox_menu(roles_names, " Role removal:")
     if removed_roles is not None:
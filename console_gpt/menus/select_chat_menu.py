@@ -2,6 +2,9 @@ import json
 import os
 from typing import Dict, List, Optional
 
+from console_gpt.attachment_store import externalize
+from console_gpt.chat_index import ChatIndex, chat_preview
+from console_gpt.chat_journal import JOURNAL_SUFFIX, load_chat
 from console_gpt.config_manager import CHATS_PATH, fetch_variable
 from console_gpt.custom_stdout import colored, custom_print
 from console_gpt.general_utils import flush_lines
@@ -15,18 +18,18 @@ Select chat to continue
 def _read_old_chat(chat_name: str, already_failed=False) -> Optional[List[Dict]]:
     """
     Supporting function for select_chat_menu().
-    This will extract and verify the content of the JSON file
+    This will extract and verify the content of the JSON (or JSONL journal) file
     :param chat_name: the name of the chat file
     :param already_failed: Used to catch if the user generated an error 1+ times
     :return: The content of the file or start the menu again.
     """
     full_path = os.path.join(CHATS_PATH, chat_name)
     try:
-        with open(full_path, "r") as file:
-            data = json.load(file)
-            # Automatically flush the error message on successful loading
-            flush_lines((3 if already_failed else 0))
-            custom_print("ok", f"Successfully loaded previous chat - {chat_name}")
+        # Images of older chats are moved to the attachment store, the chat is referencing them from now on
+        data = externalize(load_chat(full_path))
+        # Automatically flush the error message on successful loading
+        flush_lines((3 if already_failed else 0))
+        custom_print("ok", f"Successfully loaded previous chat - {chat_name}")
         return data
     except json.JSONDecodeError as e:
         arrow = colored("╰─❯", "red")
@@ -45,12 +48,25 @@ def select_chat_menu(already_failed=False) -> Optional[List[Dict]]:
     :return: The selected conversion
     """
     _show_menu = fetch_variable("features", "continue_chat")
-    menu_data = os.listdir(CHATS_PATH)
-    if not len(menu_data) or not _show_menu:
+    if not _show_menu:
+        return None
+    # The most recent chats first, described from the index without opening them
+    chats = ChatIndex.shared().refresh()
+    if not chats:
         return None
-    extensionless_data = [x.removesuffix(".json") for x in menu_data]
+    menu_data = [info.name for info in chats]
+    extensionless_data = [x.removesuffix(JOURNAL_SUFFIX).removesuffix(".json") for x in menu_data]
+    previews = {name: chat_preview(info) for name, info in zip(extensionless_data, chats)}
     manu_title = "Continue an old chat?:"
-    selection = base_multiselect_menu("Chat Select", extensionless_data, manu_title, 0, True)
+    selection = base_multiselect_menu(
+        "Chat Select",
+        extensionless_data,
+        manu_title,
+        0,
+        True,
+        preview_command=lambda item: previews.get(item, ""),
+        preview_size=0.4,
+    )
     if selection == "Skip":
         return None
     return _read_old_chat(menu_data[extensionless_data.index(selection) - 1], already_failed)
@@ -12,8 +12,8 @@ def tools_menu(tools):
     elif "Return without changes" in parent_selection:
         return tools
     elif "Select some tools" in parent_selection:
-        with MCPClient() as mcp:
-            tools = mcp.get_available_tools()
+        mcp = MCPClient.session()
+        tools = mcp.get_available_tools() if mcp is not None else []
         menu_items = [
             {
                 "label": str(tool.get("name", "Unknown")),
@@ -1,4 +1,3 @@
-import base64
 from typing import Dict, Union
 
 from PIL import Image
@@ -6,6 +5,7 @@ from PIL import Image
 from console_gpt.constants import style
 from console_gpt.custom_stdin import custom_input
 from console_gpt.custom_stdout import custom_print
+from console_gpt.image_processing import process_image
 from console_gpt.prompts.file_prompt import browser_files
 
 
@@ -24,34 +24,27 @@ def _is_image(path_to_image: str) -> Union[bool, str]:
         return "Not a valid image!"
 
 
-def _encode_image(image_path) -> str:
+def _store_image(image_path, model_title) -> Dict[str, str]:
     """
-    Open an image and convert it to base64 as per OpenAI requirements
+    Add an image (scaled down for the model) to the attachment store, the message only references it
     :param image_path: Path to the image
-    :return: base64 encoded string
+    :param model_title: Key of the model in [chat.models]
+    :return: The reference part (encoded for the provider when the request is sent)
     """
     with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode("utf-8")
+        return process_image(image_file.read(), model_title)
 
 
 def upload_image(model_title) -> Union[Dict, None]:
     """
-    Allows uploading images to GPT by converting them to Base64 and encode them
+    Allows uploading images to the model, the image is kept in the attachment store and referenced by the message
     :return: None if SIGINT or the whole request body
     """
     image_path = browser_files("Select an image:", "Image selection cancelled.", _is_image)
     if not image_path:
         return None
 
-    encoded_image = _encode_image(image_path)
-
-    if model_title.startswith("anthropic"):
-        data = {"type": "image", "source": {"type": "base64", "media_type": "image/jpeg", "data": encoded_image}}
-    else:
-        data = {
-            "type": "image_url",
-            "image_url": {"url": f"data:image/jpeg;base64,{encoded_image}"},
-        }
+    data = _store_image(image_path, model_title)
 
     additional_data = custom_input(
         auto_exit=False,
@@ -1,10 +1,13 @@
 import json
 import os.path
 import re
+import sqlite3
 from datetime import datetime
 from typing import Dict, List
 
 from console_gpt.catch_errors import eof_wrapper
+from console_gpt.chat_index import ChatIndex
+from console_gpt.chat_journal import JOURNAL_SUFFIX, ChatJournal
 from console_gpt.config_manager import CHATS_PATH, fetch_variable
 from console_gpt.constants import style
 from console_gpt.custom_stdin import custom_input
@@ -35,8 +38,11 @@ def save_chat(conversation: List[Dict], ask: bool = False, skip_exit: bool = Fal
     """
     # Determines if the prompt should be shown
     _show_menu = fetch_variable("features", "save_chat_on_exit")
+    journal = ChatJournal.active()
     # If False the whole code will be skipped
     if not skip_exit and not _show_menu:
+        if journal is not None:
+            journal.discard()
         if fetch_variable("features", "mcp_client"):
             with MCPClient(auto_start=False) as mcp:
                 if mcp is not None:
@@ -45,7 +51,8 @@ def save_chat(conversation: List[Dict], ask: bool = False, skip_exit: bool = Fal
 
     base_name = "chat"
     timestamp = datetime.now().strftime("%Y_%m_%d_%H%M%S")
-    file_name = f"{base_name}_{timestamp}.json"
+    # Chats are kept as their journal, unless a name ending with .json is given
+    file_name = f"{base_name}_{timestamp}{'.json' if journal is None else JOURNAL_SUFFIX}"
 
     prompt_message = (
         f"Please provide a file name to save the chat.\n" f"╰─❯ Press 'ENTER' for the default name ({file_name}):"
@@ -72,12 +79,27 @@ def save_chat(conversation: List[Dict], ask: bool = False, skip_exit: bool = Fal
         )
         chat_name = file_name if chat_name == "" else chat_name
         chat_name = re.sub(r"(\t|\s|\n)+", "_", chat_name)
-        chat_name = chat_name if chat_name.endswith(".json") else chat_name + ".json"
-        full_path = os.path.join(CHATS_PATH, chat_name)
-        with open(full_path, "w", encoding="utf-8") as file:
-            json.dump(conversation, file, indent=4, ensure_ascii=False)
+        if journal is not None and not chat_name.endswith(".json"):
+            chat_name = chat_name if chat_name.endswith(JOURNAL_SUFFIX) else chat_name + JOURNAL_SUFFIX
+            full_path = os.path.join(CHATS_PATH, chat_name)
+            # Renamed instead of written anew, the journal already holds the chat
+            journal.save_as(full_path, conversation)
+        else:
+            chat_name = chat_name if chat_name.endswith(".json") else chat_name + ".json"
+            full_path = os.path.join(CHATS_PATH, chat_name)
+            with open(full_path, "w", encoding="utf-8") as file:
+                json.dump(conversation, file, indent=4, ensure_ascii=False)
+        try:
+            ChatIndex.shared().update(chat_name, conversation, journal.model if journal is not None else "")
+        except sqlite3.Error as e:
+            # The chat itself is saved, the index catches up on the next listing
+            custom_print("warn", f"Could not update the chat index: {e}")
+        if journal is not None and not skip_exit:
+            journal.discard()
         custom_print("info", f"Successfully saved to - {full_path}", (None if skip_exit else 0))
     else:
+        if journal is not None:
+            journal.discard()
         if not skip_exit:
             if fetch_variable("features", "mcp_client"):
                 with MCPClient(auto_start=False) as mcp:
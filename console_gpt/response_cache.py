@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from console_gpt.config_manager import BASE_PATH, fetch_variable
+
+"""
+Response cache - replays the reply of an identical deterministic request from disk
+One JSON file per request hash, the modification time of a file is its last use (for the LRU eviction).
+"""
+
+CACHE_PATH = os.path.join(BASE_PATH, "app-data", "response_cache")
+# Request parameters which change the reply and their defaults (the stream flag doesn't)
+KEY_FIELDS = (
+    ("model", None),
+    ("messages", []),
+    ("temperature", 1.0),
+    ("tools", []),
+    ("cached", False),
+    ("thinking", False),
+)
+
+
+def request_key(params: Dict[str, Any]) -> str:
+    """
+    Canonical hash of a completion request
+    :param params: The arguments of the request (model, messages, temperature, tools, ...)
+    :return: Hex digest, equal for requests which only differ in key order or missing defaults
+    """
+    canonical = {name: default if params.get(name) is None else params[name] for name, default in KEY_FIELDS}
+    canonical["temperature"] = float(canonical["temperature"])
+    payload = json.dumps(canonical, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def is_cacheable(params: Dict[str, Any], opt_in: bool = False) -> bool:
+    """
+    :param params: The arguments of the request
+    :param opt_in: Cache the request whatever its temperature
+    :return: True if the reply may be served from (and stored in) the cache
+    """
+    if not fetch_variable("response_cache", "enabled", default=True):
+        return False
+    return opt_in or fetch_variable("response_cache", "any_temperature", default=False) or not params["temperature"]
+
+
+class ResponseCache:
+    """
+    Size limited on-disk cache of replies.
+    Entries expire after response_cache.ttl_hours, the least recently used ones are evicted above max_size_mb.
+    """
+
+    _instance: Optional["ResponseCache"] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, path: str = CACHE_PATH) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None  # Bytes of all entries, counted on the first write
+        os.makedirs(path, exist_ok=True)
+
+    @classmethod
+    def shared(cls) -> "ResponseCache":
+        """:return: The response cache of this process"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        :param key: Hash of the request (request_key())
+        :return: The cached reply or None
+        """
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get("created", 0) > fetch_variable("response_cache", "ttl_hours", default=168) * 3600:
+            self._remove(entry_path)
+            return None
+        try:
+            os.utime(entry_path)  # Mark as recently used
+        except OSError:
+            pass
+        return entry
+
+    def put(self, key: str, reply: Dict[str, Any]) -> None:
+        """
+        Store a reply, evicting the least recently used entries if the cache gets too big
+        :param key: Hash of the request (request_key())
+        :param reply: {"content": ..., "tool_calls": [...], "reasoning": ..., "usage": {...}}
+        """
+        data = json.dumps({**reply, "created": time.time()}, ensure_ascii=False).encode("utf-8")
+        entry_path = self._entry_path(key)
+        tmp_path = f"{entry_path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, entry_path)
+        except OSError:
+            self._remove(tmp_path)
+            return
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data)
+            if self._size > fetch_variable("response_cache", "max_size_mb", default=100) * 1024 * 1024:
+                self._evict()
+
+    def _scan_size(self) -> int:
+        """Supporting function for put(), bytes of all entries on disk."""
+        return sum(entry.stat().st_size for entry in os.scandir(self.path) if entry.name.endswith(".json"))
+
+    def _evict(self) -> None:
+        """Supporting function for put(), removes the least recently used entries until 90% of the limit is left."""
+        limit = fetch_variable("response_cache", "max_size_mb", default=100) * 1024 * 1024 * 0.9
+        entries = sorted(
+            (entry.stat().st_mtime, entry.stat().st_size, entry.path)
+            for entry in os.scandir(self.path)
+            if entry.name.endswith(".json")
+        )
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, entry_path in entries:
+            if size <= limit:
+                break
+            self._remove(entry_path)
+            size -= entry_size
+        self._size = size
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
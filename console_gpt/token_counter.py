@@ -0,0 +1,201 @@
+import math
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # Optional, the heuristic is used instead
+    tiktoken = None
+
+from console_gpt.attachment_store import REF_TYPE
+from console_gpt.cache_planner import ATTACHMENT_KEY
+from console_gpt.config_manager import fetch_variable
+from console_gpt.custom_stdout import custom_print
+
+"""
+Token accounting - counts the tokens of messages and fits the conversation into the context budget of a model
+"""
+
+# Fixed cost of every message (role and separators)
+MESSAGE_OVERHEAD = 4
+# Rough cost of an image, the real one depends on its size and the provider
+IMAGE_TOKENS = 1000
+# Encoding used for models tiktoken doesn't know (non-OpenAI models), close enough for budgeting
+FALLBACK_ENCODING = "o200k_base"
+# Counted messages kept by a TokenCounter, enough for the longest conversations (the oldest ones are dropped first)
+CACHE_SIZE = 4096
+
+
+class ContextUsage(NamedTuple):
+    used: int  # Tokens of the messages which are sent
+    budget: int  # Tokens available for them (0 if the model has no budget)
+    dropped: int  # Old messages which are no longer sent to fit the budget
+
+
+@lru_cache(maxsize=None)
+def _encoding(model_name: str) -> Optional[Any]:
+    """
+    Supporting function for TokenCounter
+    :param model_name: Name of the model at the provider
+    :return: The tiktoken encoding of the model or None to use the heuristic
+    """
+    if tiktoken is None or fetch_variable("context", "tokenizer", default="auto") == "heuristic":
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            return tiktoken.get_encoding(FALLBACK_ENCODING)
+    except Exception:  # Encodings are downloaded on first use, which fails offline
+        return None
+
+
+def heuristic_tokens(text: str) -> int:
+    """
+    Fast estimate for when no tokenizer is available (about 4 bytes per token for English, less for other scripts)
+    :param text: Any text
+    :return: Estimated number of tokens
+    """
+    return math.ceil(len(text.encode("utf-8")) / 4)
+
+
+class TokenCounter:
+    """
+    Counts tokens for a single model.
+    The count of every message is cached (the latest CACHE_SIZE ones), so each one is counted once no matter how often
+    the conversation is sent.
+    """
+
+    def __init__(self, model_name: str) -> None:
+        self.encoding = _encoding(model_name)
+        # id(message) -> (message, content, tokens, attachment tokens), the references keep the id from being reused
+        self._cache: "OrderedDict[int, Tuple[Dict, Any, int, int]]" = OrderedDict()
+
+    def count_text(self, text: str) -> int:
+        """
+        :param text: Any text
+        :return: Number of tokens of the text
+        """
+        if not text:
+            return 0
+        if self.encoding is None:
+            return heuristic_tokens(text)
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def _count_content(self, content: Any) -> int:
+        """
+        Supporting function for count_message()
+        :param content: Text or a list of content parts (text, images, ...)
+        :return: Number of tokens of the content
+        """
+        if isinstance(content, str):
+            return self.count_text(content)
+        tokens = 0
+        for part in content or []:
+            if not isinstance(part, dict):
+                tokens += self.count_text(str(part))
+            elif part.get("type") in ("image", "image_url", REF_TYPE):
+                tokens += IMAGE_TOKENS
+            else:
+                tokens += self.count_text(part.get("text", ""))
+        return tokens
+
+    def _message_counts(self, message: Dict[str, Any]) -> Tuple[int, int]:
+        """
+        Supporting function for count_message() and count_attachment()
+        :param message: A message of the conversation
+        :return: Number of tokens of the message and of its attachment alone (cached)
+        """
+        content = message.get("content")
+        cached = self._cache.get(id(message))
+        if cached and cached[0] is message and cached[1] is content:
+            self._cache.move_to_end(id(message))
+            return cached[2], cached[3]
+
+        attachment = self.count_text(message.get(ATTACHMENT_KEY, ""))
+        tokens = MESSAGE_OVERHEAD + self._count_content(content) + attachment
+        for tool_call in message.get("tool_calls") or []:
+            function = tool_call.get("function", {})
+            tokens += self.count_text(function.get("name", "")) + self.count_text(function.get("arguments", ""))
+        self._cache[id(message)] = (message, content, tokens, attachment)
+        self._cache.move_to_end(id(message))
+        if len(self._cache) > CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return tokens, attachment
+
+    def count_message(self, message: Dict[str, Any]) -> int:
+        """
+        :param message: A message of the conversation
+        :return: Number of tokens of the message (cached)
+        """
+        return self._message_counts(message)[0]
+
+    def count_attachment(self, message: Dict[str, Any]) -> int:
+        """
+        :param message: A user message
+        :return: Number of tokens of its attachment, 0 if it has none (cached)
+        """
+        return self._message_counts(message)[1]
+
+    def count(self, messages: List[Dict[str, Any]]) -> int:
+        """
+        :param messages: Messages of the conversation
+        :return: Number of tokens of all messages
+        """
+        return sum(self.count_message(message) for message in messages)
+
+
+def split_turns(messages: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """
+    Group the messages into turns (used by fit_to_budget() and the compaction).
+    A turn starts with a user message, so tool results always stay with the tool calls they answer.
+    """
+    turns = []
+    for message in messages:
+        if not turns or message.get("role") == "user":
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def fit_to_budget(
+    messages: List[Dict[str, Any]], counter: TokenCounter, budget: int
+) -> Tuple[List[Dict[str, Any]], ContextUsage]:
+    """
+    Leave out the oldest turns until the conversation fits the budget.
+    The leading system messages and the latest turn are always kept.
+    :param messages: The conversation
+    :param counter: Token counter of the model
+    :param budget: Tokens available for the messages, 0 for no limit
+    :return: The messages to send and how much of the budget they use
+    """
+    system_length = next((i for i, message in enumerate(messages) if message.get("role") != "system"), len(messages))
+    system, rest = messages[:system_length], messages[system_length:]
+    used = counter.count(system)
+    if not budget:
+        return messages, ContextUsage(used + counter.count(rest), 0, 0)
+
+    kept: List[Dict[str, Any]] = []
+    for turn in reversed(split_turns(rest)):
+        tokens = counter.count(turn)
+        if kept and used + tokens > budget:
+            break
+        kept.extend(reversed(turn))
+        used += tokens
+    kept.reverse()
+    return system + kept, ContextUsage(used, budget, len(rest) - len(kept))
+
+
+def print_context_usage(usage: ContextUsage) -> None:
+    """
+    Show how much of the context budget is left
+    :param usage: Usage of the next request
+    :return: Nothing, just prints
+    """
+    if not usage.budget:
+        return
+    text = f"Context: {usage.used:,} of {usage.budget:,} tokens used ({max(usage.budget - usage.used, 0):,} left)"
+    if usage.dropped:
+        text += f", {usage.dropped} older messages are no longer sent"
+    custom_print("warn" if usage.dropped else "info", text)
@@ -0,0 +1,111 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from console_gpt.config_manager import fetch_variable
+from console_gpt.custom_stdout import custom_print, markdown_print
+from mcp_servers.mcp_tcp_client import MCPClient
+
+"""
+Concurrent execution of the tool calls requested within a single reply
+"""
+
+# Semaphores capping the concurrent calls of each MCP server (by server and limit), shared by every reply of the session
+_server_limits: Dict[Tuple[str, int], threading.BoundedSemaphore] = {}
+_server_limits_lock = threading.Lock()
+
+
+class ToolCall(NamedTuple):
+    id: str
+    name: str
+    arguments: str  # JSON encoded, exactly as returned by the model
+
+
+class ToolResult(NamedTuple):
+    tool_call_id: str
+    content: str
+    failed: bool
+
+
+def _server_of(mcp: Optional[MCPClient], tool_name: str) -> str:
+    """
+    Supporting function for execute_tool_calls()
+    :param mcp: The shared MCP client (or None)
+    :param tool_name: The name of the called tool
+    :return: The name of the MCP server owning the tool (empty string if unknown)
+    """
+    return mcp.tool_servers.get(tool_name, "") if mcp is not None else ""
+
+
+def _server_limit(server_name: str, per_server: int) -> threading.BoundedSemaphore:
+    """
+    Supporting function for execute_tool_calls()
+    :param server_name: The name of the MCP server (empty string if unknown)
+    :param per_server: Maximum concurrent calls of a server
+    :return: The semaphore of the server, created on its first call
+    """
+    with _server_limits_lock:
+        if (server_name, per_server) not in _server_limits:
+            _server_limits[server_name, per_server] = threading.BoundedSemaphore(per_server)
+        return _server_limits[server_name, per_server]
+
+
+def _run_tool_call(
+    mcp: Optional[MCPClient], tool_call: ToolCall, limits: Dict[str, threading.Semaphore], timeout: float
+) -> ToolResult:
+    """
+    Execute a single tool call, never raises
+    :param mcp: The shared MCP client (or None if the server is unavailable)
+    :param tool_call: The tool call to execute
+    :param limits: Semaphores of the MCP servers, capping their concurrent calls across the session
+    :param timeout: Seconds to wait for the tool result
+    :return: The result of the call, failures are returned as content
+    """
+    try:
+        if mcp is None:
+            raise ConnectionError("Could not establish connection to MCP server")
+        arguments = json.loads(tool_call.arguments) if tool_call.arguments else {}
+        with limits[_server_of(mcp, tool_call.name)]:
+            content = str(mcp.call_tool(tool_call.name, arguments, timeout))
+        return ToolResult(tool_call.id, content, False)
+    except Exception as e:
+        custom_print("error", f"Error calling tool: {e}")
+        return ToolResult(tool_call.id, str(e), True)
+
+
+def execute_tool_calls(tool_calls: List[ToolCall], announce: bool = True) -> List[ToolResult]:
+    """
+    Execute all tool calls of a single reply through the shared MCP session.
+    Independent calls are dispatched at once (capped per MCP server across the session, calls abandoned on SIGINT
+    included) and the results keep the order of the calls.
+    :param tool_calls: The tool calls requested by the model
+    :param announce: Print the name of every triggered tool
+    :return: One result per tool call, in the same order
+    """
+    if not tool_calls:
+        return []
+
+    if announce:
+        for tool_call in tool_calls:
+            markdown_print(f"> Triggered: `{tool_call.name}`.")
+
+    mcp = MCPClient.session()
+    timeout = fetch_variable("mcp", "tool_timeout", default=120)
+    per_server = fetch_variable("mcp", "max_concurrency_per_server", default=4)
+    limits = {
+        server_name: _server_limit(server_name, per_server)
+        for server_name in {_server_of(mcp, tool_call.name) for tool_call in tool_calls}
+    }
+
+    if len(tool_calls) == 1 or not fetch_variable("mcp", "parallel_tool_calls", default=True):
+        return [_run_tool_call(mcp, tool_call, limits, timeout) for tool_call in tool_calls]
+
+    max_workers = min(len(tool_calls), fetch_variable("mcp", "max_parallel_tool_calls", default=8))
+    pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool-call")
+    try:
+        futures = [pool.submit(_run_tool_call, mcp, tool_call, limits, timeout) for tool_call in tool_calls]
+        return [future.result() for future in futures]
+    finally:
+        # On SIGINT don't wait for the pending calls, they are abandoned
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,81 @@
+import collections
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Run from anywhere: python helpers/mcp_transport_benchmark.py [round trips]
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from mcp_servers.mcp_tcp_client import _Connection
+from mcp_servers.server_manager import READY_LINE
+
+SERVER_SCRIPT = Path(__file__).parent.parent / "mcp_servers" / "mcp_tcp_server.py"
+BENCHMARK_PORT = 8799  # Away from the default port, so a running chat isn't disturbed
+
+
+def start_server(tmp_dir, extra_args):
+    """Start a dedicated MCP server (with the servers of mcp_config.json) and wait until it listens."""
+    # Keep the pidfile, log and tools cache of a running chat untouched
+    own_files = {"--pid-file": "benchmark.pid", "--log-file": "benchmark.log", "--tools-cache": "benchmark_tools.json"}
+    args = [arg for option, name in own_files.items() for arg in (option, str(Path(tmp_dir) / name))]
+    process = subprocess.Popen(
+        [sys.executable, str(SERVER_SCRIPT), "--port", str(BENCHMARK_PORT)] + args + extra_args,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    for line in process.stdout:
+        if line.strip() == READY_LINE:
+            # Keep reading the server's output, a full pipe would block its logging
+            threading.Thread(target=collections.deque, args=(process.stdout, 0), daemon=True).start()
+            return process
+    raise RuntimeError("The MCP server exited before it was ready")
+
+
+def measure(socket_path, round_trips):
+    """Sequential ping latency and pipelined ping throughput over one connection."""
+    conn = _Connection("localhost", BENCHMARK_PORT, socket_path)
+    conn.handshake()
+
+    latencies = []
+    for _ in range(round_trips):
+        start = time.perf_counter()
+        conn.request({"command": "ping"})
+        latencies.append((time.perf_counter() - start) * 1_000_000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        list(pool.map(lambda _: conn.request({"command": "ping"}), range(round_trips)))
+    throughput = round_trips / (time.perf_counter() - start)
+
+    conn.close()
+    latencies.sort()
+    return {
+        "p50": statistics.median(latencies),
+        "p99": latencies[int(len(latencies) * 0.99) - 1],
+        "throughput": throughput,
+    }
+
+
+def main():
+    round_trips = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        transports = {"tcp": None, "unix": str(Path(tmp_dir) / "benchmark.sock")}
+        print(f"{round_trips} pings per transport\n")
+        print(f"{'transport':<10}{'p50 (us)':>12}{'p99 (us)':>12}{'pipelined (req/s)':>20}")
+        for name, socket_path in transports.items():
+            process = start_server(tmp_dir, ["--unix-socket", socket_path] if socket_path else [])
+            try:
+                result = measure(socket_path, round_trips)
+            finally:
+                process.terminate()
+                process.wait()
+            print(f"{name:<10}{result['p50']:>12.1f}{result['p99']:>12.1f}{result['throughput']:>20.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,13 @@
+import argparse
+import os
+
 from rich.console import Console
 
 from console_gpt.assistant import assistant
+from console_gpt.batch import run_batch
 from console_gpt.chat import chat
 from console_gpt.config_manager import check_config_version, fetch_variable
+from console_gpt.cost_tracker import cost_report
 from console_gpt.custom_stdin import custom_input
 from console_gpt.general_utils import intro_message, set_locale
 from console_gpt.menus.ai_managed import managed_prompt
@@ -45,5 +50,25 @@ def console_gpt() -> None:
             raise TypeError("combined_menu() returned an unexpected type.")
 
 
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Chat with multiple AI models from the terminal.")
+    subparsers = parser.add_subparsers(dest="command")
+    batch_parser = subparsers.add_parser("batch", help="Run a JSONL file of requests without the interactive UI")
+    batch_parser.add_argument("input", help='JSONL file, one {"model", "messages", "temperature"} request per line')
+    batch_parser.add_argument("-o", "--output", help="JSONL file for the results (default: <input>.out.jsonl)")
+    batch_parser.add_argument("-c", "--concurrency", type=int, help="Requests running at the same time")
+    cost_parser = subparsers.add_parser("cost", help="Print the recorded costs per model")
+    cost_parser.add_argument("-d", "--days", type=int, default=30, help="Days covered by the report (default: 30)")
+    args = parser.parse_args()
+
+    if args.command == "batch":
+        output = args.output or f"{os.path.splitext(args.input)[0]}.out.jsonl"
+        run_batch(args.input, output, args.concurrency)
+    elif args.command == "cost":
+        cost_report(args.days)
+    else:
+        console_gpt()
+
+
 if __name__ == "__main__":
-    console_gpt()
+    main()
@@ -1,12 +1,25 @@
+import copy
+import itertools
 import json
+import os
+import queue
+import select
 import socket
-from typing import Any, Dict, List, Tuple
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
 
+from console_gpt.config_manager import BASE_PATH, _file_signature
 from console_gpt.custom_stdout import custom_print
 
 from .mcp_errors import MCPError
 from .server_manager import ServerManager
 
+# Version 2 adds request ids, pipelining and out-of-order responses
+PROTOCOL_VERSION = 2
+
+MCP_CONFIG_PATH = os.path.join(BASE_PATH, "mcp_config.json")
+
 
 class MCPClientError(Exception):
     def __init__(self, error: MCPError):
@@ -14,35 +27,278 @@ class MCPClientError(Exception):
         super().__init__(str(error.message))
 
 
+class _Connection:
+    """
+    A single length-prefixed JSON connection to the MCP TCP server (over TCP or a unix domain socket).
+    If the server speaks protocol 2 the connection is multiplexed: requests carry an id, any number of
+    them can be in-flight at once and a background reader hands every response to its waiting caller.
+    """
+
+    def __init__(self, host: str, port: int, socket_path: Optional[str] = None):
+        if socket_path:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                self.sock.connect(socket_path)
+            except FileNotFoundError as e:
+                # No socket file means no server, same as a refused TCP connection
+                self.sock.close()
+                raise ConnectionRefusedError(str(e)) from e
+            except OSError:
+                self.sock.close()
+                raise
+        else:
+            self.sock = socket.create_connection((host, port))
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.multiplexed = False
+        self._pending: Dict[int, Future] = {}
+        self._request_ids = itertools.count(1)
+        self._send_lock = threading.Lock()
+        self._reader: Optional[threading.Thread] = None
+
+    def handshake(self) -> bool:
+        """
+        Negotiate the protocol version. Servers which predate the handshake reply with an error
+        and the connection simply stays in the one-request-at-a-time mode.
+        :return: Whether the connection is multiplexed
+        """
+        response = self._exchange({"command": "hello", "protocol": PROTOCOL_VERSION, "id": 0}, timeout=5)
+        if response.get("status") == "success" and response.get("protocol", 1) >= 2:
+            self.multiplexed = True
+            self._reader = threading.Thread(target=self._read_responses, name="mcp-reader", daemon=True)
+            self._reader.start()
+        return self.multiplexed
+
+    def is_alive(self) -> bool:
+        """Cheap liveness check. An idle connection has nothing to read unless the server closed it."""
+        if self.sock is None:
+            return False
+        if self.multiplexed:
+            # The reader thread owns the socket and closes it as soon as the server goes away
+            return self._reader.is_alive()
+        try:
+            readable, _, _ = select.select([self.sock], [], [], 0)
+            if not readable:
+                return True
+            return bool(self.sock.recv(1, socket.MSG_PEEK))
+        except (OSError, ValueError):
+            return False
+
+    def request(self, request: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Send a single request and block until its response is received (or the timeout expires)."""
+        if not self.multiplexed:
+            return self._exchange(request, timeout)
+
+        request_id = next(self._request_ids)
+        future = Future()
+        self._pending[request_id] = future
+        try:
+            # Checked after registering, so a reader failing right now can't leave us waiting forever
+            if self.sock is None:
+                raise ConnectionError("Connection closed by server")
+            with self._send_lock:
+                self._send_frame({**request, "id": request_id})
+            return future.result(timeout)
+        finally:
+            self._pending.pop(request_id, None)
+
+    def _exchange(self, request: Dict[str, Any], timeout: Optional[float]) -> Dict[str, Any]:
+        """Strict request/response round-trip, only valid while nothing else is in-flight."""
+        self.sock.settimeout(timeout)
+        self._send_frame(request)
+        response_data = self._recv_frame()
+        self.sock.settimeout(None)
+        if not response_data:
+            return {
+                "status": "error",
+                "error": {"error_type": "EMPTY_RESPONSE", "message": "Empty response received from server"},
+            }
+        return json.loads(response_data.decode())
+
+    def _read_responses(self) -> None:
+        """Reader thread of a multiplexed connection, responses may arrive in any order."""
+        try:
+            while True:
+                response = json.loads(self._recv_frame().decode())
+                future = self._pending.pop(response.get("id"), None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        except Exception as e:
+            error = e if isinstance(e, ConnectionError) else ConnectionError(str(e))
+            self.close()
+            for future in list(self._pending.values()):
+                if not future.done():
+                    future.set_exception(error)
+
+    def _send_frame(self, request: Dict[str, Any]) -> None:
+        data = json.dumps(request).encode()
+        self.sock.sendall(len(data).to_bytes(4, "big") + data)
+
+    def _recv_frame(self) -> bytes:
+        msg_length = int.from_bytes(self._recv_exactly(4), "big")
+        return self._recv_exactly(msg_length)
+
+    def _recv_exactly(self, length: int) -> bytes:
+        sock = self.sock
+        if sock is None:
+            raise ConnectionError("Connection closed")
+        chunks = []
+        bytes_received = 0
+        while bytes_received < length:
+            chunk = sock.recv(min(length - bytes_received, 65536))
+            if not chunk:
+                raise ConnectionError("Connection closed by server")
+            chunks.append(chunk)
+            bytes_received += len(chunk)
+        return b"".join(chunks)
+
+    def close(self):
+        if self.sock:
+            try:
+                # Wakes the reader thread, a plain close() doesn't end a recv() blocked in another thread
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            try:
+                self.sock.close()
+            except Exception:
+                pass
+            finally:
+                self.sock = None
+
+
 class MCPClient:
     _server_failed = False  # Class-level flag to track server failure
+    _session: Optional["MCPClient"] = None  # Long-lived client shared by the whole chat session
+    _session_lock = threading.Lock()
+    _catalog_cache: Optional[Dict[str, Any]] = None  # Last tool catalog received from the server
 
-    def __init__(self, host: str = "localhost", port: int = 8765, auto_start: bool = True):
+    def __init__(self, host: str = "localhost", port: int = 8765, auto_start: bool = True, pool_size: int = 8):
         self.host = host
         self.port = port
-        self.sock = None
         self.server_manager = ServerManager(host, port)
         self.auto_start = auto_start
+        # Name of the MCP server owning each tool, filled by get_available_tools()
+        self.tool_servers: Dict[str, str] = {}
+        # Single connection shared by all callers when the server supports multiplexing (protocol 2+)
+        self._multiplexed: Optional[_Connection] = None
+        self._multiplexed_lock = threading.Lock()
+        # Idle connections ready for reuse with older servers, the most recently used one is handed out first
+        self._idle: "queue.LifoQueue[_Connection]" = queue.LifoQueue(maxsize=pool_size)
+
+    @classmethod
+    def session(cls) -> Optional["MCPClient"]:
+        """
+        Return the process-wide client, connecting (and starting the server) only on first use.
+        Connections are pooled and health-checked, so repeated tool calls skip the process scan and TCP handshake.
+        :return: The shared client or None if the server is unavailable
+        """
+        with cls._session_lock:
+            if MCPClient._server_failed:
+                return None
+            if cls._session is None:
+                client = cls()
+                if not client.connect():
+                    return None
+                cls._session = client
+            return cls._session
 
-    def _connect(self) -> bool:
-        """Internal method to establish connection."""
+    @classmethod
+    def close_session(cls) -> None:
+        """Drop the shared client and all of its pooled connections."""
+        with cls._session_lock:
+            if cls._session is not None:
+                cls._session.close()
+                cls._session = None
+
+    def _dial(self) -> _Connection:
+        """Connect and negotiate the protocol version."""
+        conn = _Connection(self.host, self.port, self.server_manager.socket_path)
         try:
-            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.sock.connect((self.host, self.port))
-            return True
+            conn.handshake()
+        except Exception:
+            conn.close()
+            raise
+        return conn
 
+    def _open_connection(self) -> Optional[_Connection]:
+        """Internal method to establish a new connection, starting the server if allowed."""
+        try:
+            return self._dial()
         except ConnectionRefusedError as e:
-            self.sock = None
-            custom_print("error", f"Connection refused: {e}")
-            if self.auto_start:
-                custom_print("error", "Failed to connect to MCP server even after starting it")
-            else:
+            if not self.auto_start or MCPClient._server_failed:
+                custom_print("error", f"Connection refused: {e}")
                 custom_print("error", "MCP Server is not running.")
-            return False
+                return None
         except Exception as e:
-            self.sock = None
             custom_print("error", f"Error during connection attempt: {e}")
+            return None
+
+        # The server is not listening - (re)start it and try once more
+        success, message = self.server_manager.start_server()
+        if not success:
+            custom_print("error", f"Failed to start MCP server: {message}")
+            MCPClient._server_failed = True
+            return None
+        try:
+            return self._dial()
+        except Exception as e:
+            custom_print("error", f"Connection refused: {e}")
+            custom_print("error", "Failed to connect to MCP server even after starting it")
+            return None
+
+    def _acquire(self) -> Tuple[Optional[_Connection], bool]:
+        """
+        Take the shared multiplexed connection, a healthy connection from the pool or open a new one.
+        :return: The connection (or None) and whether it was reused
+        """
+        with self._multiplexed_lock:
+            if self._multiplexed is not None:
+                if self._multiplexed.is_alive():
+                    return self._multiplexed, True
+                self._multiplexed = None
+
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if conn.is_alive():
+                return conn, True
+            conn.close()
+
+        conn = self._open_connection()
+        if conn is not None and conn.multiplexed:
+            conn = self._share(conn)
+        return conn, False
+
+    def _share(self, conn: _Connection) -> _Connection:
+        """Make a multiplexed connection the shared one, unless another thread was faster."""
+        with self._multiplexed_lock:
+            if self._multiplexed is not None and self._multiplexed.is_alive():
+                conn.close()
+                return self._multiplexed
+            self._multiplexed = conn
+            return conn
+
+    def _release(self, conn: _Connection) -> None:
+        """Return a connection to the pool, closing it if the pool is already full."""
+        if conn.multiplexed:
+            return  # Never checked out exclusively
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def connect(self) -> bool:
+        """Make sure the server is reachable and keep the connection for later reuse."""
+        conn = self._open_connection()
+        if conn is None:
             return False
+        if conn.multiplexed:
+            self._share(conn)
+        else:
+            self._release(conn)
+        return True
 
     def _handle_response(self, response: Dict[str, Any]) -> Any:
         """Handle server response and raise appropriate exceptions."""
@@ -52,63 +308,85 @@ class MCPClient:
             raise MCPClientError(error)
         return response.get("result")
 
-    def _send_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+    def _send_request(self, request: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
         """Send a request to the server and receive the response."""
-        try:
-            data = json.dumps(request).encode()
-            self.sock.sendall(len(data).to_bytes(4, "big"))
-            self.sock.sendall(data)
-
-            length_bytes = self.sock.recv(4)
-            if not length_bytes:
-                raise ConnectionError("Connection closed by server")
-
-            msg_length = int.from_bytes(length_bytes, "big")
-
-            chunks = []
-            bytes_received = 0
-            while bytes_received < msg_length:
-                chunk = self.sock.recv(min(msg_length - bytes_received, 4096))
-                if not chunk:
-                    raise ConnectionError("Connection closed by server")
-                chunks.append(chunk)
-                bytes_received += len(chunk)
-
-            response_data = b"".join(chunks)
-            if response_data:
-                try:
-                    return json.loads(response_data.decode())
-                except json.JSONDecodeError as e:
-                    custom_print("error", f"Failed to decode JSON response: {e}")
-                    return {"status": "error", "error": {"type": "JSON_DECODE_ERROR", "message": str(e)}}
-            else:
+        while True:
+            conn, reused = self._acquire()
+            if conn is None:
                 return {
                     "status": "error",
-                    "error": {"type": "EMPTY_RESPONSE", "message": "Empty response received from server"},
+                    "error": {"error_type": "CONNECTION_ERROR", "message": "Could not connect to MCP server"},
                 }
-        except (ConnectionError, socket.error, Exception) as e:
-            custom_print("error", f"Communication error: {str(e)}")
-            self.close()
-            return {"status": "error", "error": {"type": "CONNECTION_ERROR", "message": str(e)}}
+            try:
+                response = conn.request(request, timeout)
+            except socket.timeout:
+                if not conn.multiplexed:
+                    # The late response would desync the framing, so this connection can't be reused
+                    conn.close()
+                message = f"No response within {timeout} seconds"
+                return {"status": "error", "error": {"error_type": "TIMEOUT", "message": message}}
+            except json.JSONDecodeError as e:
+                # The frame was fully consumed, so the connection itself is still usable
+                self._release(conn)
+                custom_print("error", f"Failed to decode JSON response: {e}")
+                return {"status": "error", "error": {"error_type": "JSON_DECODE_ERROR", "message": str(e)}}
+            except (ConnectionError, socket.error, Exception) as e:
+                conn.close()
+                if reused:
+                    # A pooled connection may have gone stale (E.g. server restart) - retry on a fresh one
+                    continue
+                custom_print("error", f"Communication error: {str(e)}")
+                return {"status": "error", "error": {"error_type": "CONNECTION_ERROR", "message": str(e)}}
+            self._release(conn)
+            return response
 
-    def call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Any:
+    def ping(self) -> bool:
+        """Cheap round-trip to check if the server is alive and responsive."""
+        return self._send_request({"command": "ping"}).get("status") == "success"
+
+    def call_tool(self, tool_name: str, arguments: Dict[str, Any], timeout: Optional[float] = None) -> Any:
         """Call a tool on the server."""
         request = {"command": "call_tool", "tool_name": tool_name, "arguments": arguments}
 
-        response = self._send_request(request)
+        response = self._send_request(request, timeout)
         return self._handle_response(response)
 
     def get_available_tools(self) -> List[Dict[str, Any]]:
-        """Get list of available tools from the server."""
+        """
+        Get list of available tools from the server.
+        The catalog is cached for the whole process and only re-transferred if the server reports a new version
+        (or mcp_config.json was modified), otherwise the server just confirms that the cached copy is current.
+        """
+        cache = MCPClient._catalog_cache
+        config_signature = _file_signature(MCP_CONFIG_PATH)
         request = {"command": "get_tools"}
+        if cache and cache["config_signature"] == config_signature:
+            request["if_none_match"] = cache["etag"]
         response = self._send_request(request)
 
+        if response.get("status") == "not_modified":
+            catalog = cache
+        elif response.get("status") == "error":
+            return []
+        else:
+            catalog = {
+                "tools": response.get("tools", []),
+                "tool_servers": response.get("tool_servers") or {},
+                "initialization_errors": response.get("initialization_errors"),
+                "etag": response.get("etag"),
+                "config_signature": config_signature,
+            }
+            # Servers which predate the catalog versioning don't send an etag, nothing to revalidate against
+            MCPClient._catalog_cache = catalog if catalog["etag"] else None
+
         # Check for initialization errors
-        if response.get("initialization_errors"):
-            for error in response["initialization_errors"]:
+        if catalog["initialization_errors"]:
+            for error in catalog["initialization_errors"]:
                 custom_print("error", f"Server '{error['server']}' failed to initialize: {error['error']}")
 
-        return response.get("tools", [])
+        self.tool_servers = catalog["tool_servers"]
+        # Callers (and the API wrappers) modify the tool dicts, so never hand out the cached ones
+        return copy.deepcopy(catalog["tools"])
 
     def start_server(self) -> Tuple[bool, str]:
         """Start the server if it's not running."""
@@ -119,35 +397,28 @@ class MCPClient:
         if MCPClient._server_failed:  # Skip if we know server failed to start
             return True, "Server was not running"
 
-        if self.sock:
-            self.close()
+        self.close()
+        MCPClient.close_session()
         return self.server_manager.stop_server()
 
     def close(self):
-        """Close the client connection."""
-        if self.sock:
+        """Close all pooled client connections."""
+        with self._multiplexed_lock:
+            if self._multiplexed is not None:
+                self._multiplexed.close()
+                self._multiplexed = None
+        while True:
             try:
-                self.sock.close()
-            except Exception:
-                pass
-            finally:
-                self.sock = None
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
 
     def __enter__(self):
         """Context manager entry - ensures server is running and connects."""
         if MCPClient._server_failed:
             return None
 
-        if self.auto_start:
-            if not self.server_manager.is_server_running():
-                success, message = self.server_manager.start_server()
-                if not success:
-                    custom_print("error", f"Failed to start MCP server: {message}")
-                    MCPClient._server_failed = True
-                    self.close()
-                    return None
-
-        if not self._connect():
+        if not self.connect():
             return None  # Return None if connection fails
         return self
 
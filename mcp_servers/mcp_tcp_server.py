@@ -1,13 +1,17 @@
 # More about Model Context Protocol (MCP) and how to create custom MCP servers at https://modelcontextprotocol.io/introduction
 
+import argparse
 import asyncio
+import hashlib
 import json
 import logging
 import os
+import re
 import shutil
 import signal
 import subprocess
 import sys
+import time
 from typing import Any, Dict, List, Optional, Tuple
 
 from mcp import ClientSession, StdioServerParameters, Tool
@@ -19,12 +23,19 @@ from mcp_errors import (CommandNotFoundError, ConfigError, MCPError,
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)  # Set the base logger level to DEBUG
 
-# Create a FileHandler for DEBUG logs
-file_handler = logging.FileHandler(
-    os.path.join(os.path.dirname(os.path.abspath(__file__)), "mcp_tcp_server.log"), mode="w"
-)
-file_handler.setLevel(logging.DEBUG)  # Log all messages (DEBUG and above) to the file
-file_handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+LOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mcp_tcp_server.log")
+
+
+def file_log_handler(path: str) -> logging.FileHandler:
+    """FileHandler for DEBUG logs, the file is only opened (and truncated) once something is logged"""
+    handler = logging.FileHandler(path, mode="w", delay=True)
+    handler.setLevel(logging.DEBUG)  # Log all messages (DEBUG and above) to the file
+    handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+    return handler
+
+
+# Create a FileHandler for DEBUG logs (replaced if --log-file is given)
+file_handler = file_log_handler(LOG_PATH)
 
 # Create a StreamHandler for INFO logs
 stream_handler = logging.StreamHandler(sys.stdout)
@@ -35,16 +46,40 @@ stream_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(m
 logger.addHandler(file_handler)
 logger.addHandler(stream_handler)
 
+# Version 2 adds request ids, pipelining and out-of-order responses. Clients which never
+# send the "hello" handshake keep talking version 1 (strict request/response order).
+PROTOCOL_VERSION = 2
+
+# Joins the server and tool name when several servers offer a tool with the same name
+NAMESPACE_SEPARATOR = "__"
+
+# Tool lists of the servers, so lazy servers are offered without being started
+TOOLS_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mcp_tools_cache.json")
+
+# Seconds a lazy server may stay unused before it's shut down, unless it sets "idleTimeout"
+DEFAULT_IDLE_TIMEOUT = 300
+IDLE_CHECK_INTERVAL = 5
+
+# Seconds between the checks of mcp_config.json for changes
+CONFIG_CHECK_INTERVAL = 2
+
+# The server manager waits for this line on stdout and finds the process through the pidfile
+READY_LINE = "MCP server ready"
+PID_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mcp_tcp_server.pid")
+
 # Get configurations from mcp_config.json
 MCP_PATH = os.path.join(os.path.dirname(os.path.realpath(f"{__file__}/..")), "mcp_config.json")
 
-if not os.path.exists(MCP_PATH):
-    if os.path.exists(MCP_PATH + ".sample"):
-        shutil.copy(MCP_PATH + ".sample", MCP_PATH)
-        logger.info('"mcp_config.json" created from sample')
-    else:
-        logger.error('"mcp_config.json.sample" is either missing or renamed, please update from source.')
-        exit(1)
+
+def create_config_if_missing() -> None:
+    """Copy mcp_config.json from the sample on the first run (called once the logging is set up)."""
+    if not os.path.exists(MCP_PATH):
+        if os.path.exists(MCP_PATH + ".sample"):
+            shutil.copy(MCP_PATH + ".sample", MCP_PATH)
+            logger.info('"mcp_config.json" created from sample')
+        else:
+            logger.error('"mcp_config.json.sample" is either missing or renamed, please update from source.')
+            exit(1)
 
 
 class MCPServer:
@@ -55,8 +90,17 @@ class MCPServer:
         self.session = None
         self.tools = {}
         self.client_entered = False  # Track if client context was entered successfully
+        self.last_used = time.monotonic()
+        self.active_calls = 0
+        self.stop_event: Optional[asyncio.Event] = None  # Set to shut the server down
+        self.task: Optional[asyncio.Task] = None  # Owns the stdio transport while the server runs
         self.logger = logging.getLogger(f"{__name__}.MCPServer.{server_name}")
 
+    @property
+    def running(self) -> bool:
+        """Whether the server can take calls (it's started and not shutting down)."""
+        return self.session is not None and not (self.stop_event and self.stop_event.is_set())
+
     async def __aenter__(self):
         return self
 
@@ -80,12 +124,33 @@ class MCPServer:
 
 
 class MCPTCPServer:
-    def __init__(self, host: str = "localhost", port: int = 8765):
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 8765,
+        socket_path: Optional[str] = None,
+        pid_path: str = PID_PATH,
+        tools_cache_path: str = TOOLS_CACHE_PATH,
+    ):
         self.host = host
         self.port = port
+        self.socket_path = socket_path  # Listen on this unix domain socket instead of TCP
+        self.pid_path = pid_path
+        self.tools_cache_path = tools_cache_path
         self.servers: Dict[str, MCPServer] = {}
         self.initialization_timeout = 30  # 30 seconds timeout for tool initialization
         self.server_processes: Dict[str, subprocess.Popen] = {}
+        # Precomputed get_tools payload, rebuilt only when the servers change
+        self.catalog: Dict[str, Any] = {"tools": [], "tool_servers": {}, "initialization_errors": None}
+        self.catalog_etag = ""
+        self.catalog_version = 0
+        # Exposed tool name -> (server name, original tool name)
+        self.tool_routes: Dict[str, Tuple[str, str]] = {}
+        self.server_configs: Dict[str, Dict[str, Any]] = {}
+        self.loaded_config_signature: Optional[Tuple[int, int]] = None
+        self.tools_cache: Dict[str, Dict[str, Any]] = {}
+        self.start_locks: Dict[str, asyncio.Lock] = {}
+        self.background_tasks = set()
         self.logger = logging.getLogger(f"{__name__}.MCPTCPServer")
 
     @staticmethod
@@ -123,6 +188,66 @@ class MCPTCPServer:
                     if not isinstance(arg, str):
                         raise ConfigError(f"Argument {i} in server '{server_name}' must be a string", MCP_PATH)
 
+            # Check lazy start and idle shutdown fields if present
+            if "lazy" in server_config and not isinstance(server_config["lazy"], bool):
+                raise ConfigError(f"Field 'lazy' must be true or false in server '{server_name}'", MCP_PATH)
+
+            if "idleTimeout" in server_config:
+                idle_timeout = server_config["idleTimeout"]
+                if isinstance(idle_timeout, bool) or not isinstance(idle_timeout, (int, float)) or idle_timeout < 0:
+                    raise ConfigError(
+                        f"Field 'idleTimeout' must be a non-negative number in server '{server_name}'", MCP_PATH
+                    )
+
+    @staticmethod
+    def idle_timeout(server_config: Dict[str, Any]) -> float:
+        """Seconds of inactivity before the server is shut down, 0 keeps it running."""
+        return server_config.get("idleTimeout", DEFAULT_IDLE_TIMEOUT if server_config.get("lazy") else 0)
+
+    @staticmethod
+    def config_fingerprint(server_config: Dict[str, Any]) -> str:
+        """Hash of the settings which affect the tools a server offers."""
+        launch = {key: value for key, value in server_config.items() if key not in ("lazy", "idleTimeout")}
+        return hashlib.sha256(json.dumps(launch, sort_keys=True).encode()).hexdigest()
+
+    def load_tools_cache(self) -> None:
+        """Read the tool lists persisted by earlier runs, a missing or broken cache is just empty."""
+        try:
+            with open(self.tools_cache_path, "r") as f:
+                self.tools_cache = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            self.logger.debug(f"No usable tools cache: {e}")
+            self.tools_cache = {}
+
+    def save_tools_cache(self) -> None:
+        """Persist the tool lists of every server which was started at least once."""
+        for server_name, server in self.servers.items():
+            if isinstance(server, MCPServer) and server.running:
+                self.tools_cache[server_name] = {
+                    "fingerprint": self.config_fingerprint(server.server_config),
+                    "tools": [self.tool_to_dict(tool) for tool in server.tools.values()],
+                }
+        self.tools_cache = {name: entry for name, entry in self.tools_cache.items() if name in self.server_configs}
+        try:
+            tmp_path = self.tools_cache_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.tools_cache, f)
+            os.replace(tmp_path, self.tools_cache_path)
+        except OSError as e:
+            self.logger.warning(f"Could not write the tools cache: {e}")
+
+    def cached_server(self, server_name: str, server_config: Dict[str, Any]) -> Optional[MCPServer]:
+        """
+        Build a stopped server offering the tools remembered from its last run
+        :return: The server or None if its tools aren't cached for the current configuration
+        """
+        entry = self.tools_cache.get(server_name)
+        if not entry or entry.get("fingerprint") != self.config_fingerprint(server_config):
+            return None
+        server = MCPServer(server_name, server_config)
+        server.tools = {tool["name"]: Tool(**tool) for tool in entry["tools"]}
+        return server
+
     @staticmethod
     def tool_to_dict(tool: Tool) -> Dict[str, Any]:
         """Convert a Tool object to a dictionary with the specified schema."""
@@ -275,6 +400,178 @@ class MCPTCPServer:
             else:
                 raise ServerInitError(str(e), server_name)
 
+    async def launch_server(self, server_name: str, server_config: Dict[str, Any]) -> MCPServer:
+        """
+        Start a server in a task of its own and wait until its tools are listed.
+        The stdio transport has to be entered and exited by the same task, so that task keeps
+        the server alive until stop_server_instance() sets its stop event.
+        """
+        ready = asyncio.get_running_loop().create_future()
+
+        async def lifecycle():
+            try:
+                async with asyncio.timeout(self.initialization_timeout):
+                    server = await self.init_server(server_name, server_config)
+            except asyncio.CancelledError:
+                ready.cancel()
+                raise
+            except Exception as e:
+                if not ready.done():
+                    ready.set_exception(e)
+                return
+
+            server.stop_event = asyncio.Event()
+            if not ready.done():
+                ready.set_result(server)
+                await server.stop_event.wait()
+            await server.cleanup()
+            await self.terminate_process(server_name)
+            self.logger.info(f"Server {server_name} stopped")
+
+        task = asyncio.create_task(lifecycle())
+        server = await ready
+        server.task = task
+        return server
+
+    async def ensure_running(self, server_name: str) -> MCPServer:
+        """Start a lazy or idled server on first use, concurrent calls share a single start."""
+        lock = self.start_locks.setdefault(server_name, asyncio.Lock())
+        async with lock:
+            server = self.servers.get(server_name)
+            if isinstance(server, MCPServer) and server.running:
+                return server
+            if server_name not in self.server_configs:
+                raise ServerInitError("Server was removed from the configuration", server_name)
+
+            self.logger.info(f"Starting server {server_name} on demand")
+            try:
+                server = await self.launch_server(server_name, self.server_configs[server_name])
+            except TimeoutError:
+                raise ServerInitError(
+                    f"Server initialization timed out after {self.initialization_timeout} seconds", server_name
+                )
+            self.servers[server_name] = server
+            self.save_tools_cache()
+            self.rebuild_catalog()  # The tools may differ from the cached ones
+            return server
+
+    async def discover_tools(self, server_name: str) -> None:
+        """Start a lazy server whose tools aren't cached yet, it's shut down again once idle."""
+        try:
+            await self.ensure_running(server_name)
+        except Exception as e:
+            self.logger.error(f"Server initialization for {server_name} failed: {e}")
+            error = e if isinstance(e, MCPError) else ServerInitError(f"Server initialization failed: {e}", server_name)
+            self.servers[server_name] = error
+            self.rebuild_catalog()
+
+    async def stop_server_instance(self, server_name: str) -> None:
+        """Shut a running server down, it keeps its tools in the catalog and starts again on the next call."""
+        server = self.servers.get(server_name)
+        if not isinstance(server, MCPServer):
+            return
+        if server.task is None:
+            await server.cleanup()
+            return
+        server.stop_event.set()
+        try:
+            await asyncio.wait_for(server.task, timeout=10)
+        except (TimeoutError, Exception) as e:
+            self.logger.error(f"Error stopping server {server_name}: {e}")
+        server.task = None
+
+    async def terminate_process(self, server_name: str) -> None:
+        """Terminate the process spawned for a server, if it's still running."""
+        process = self.server_processes.pop(server_name, None)
+        if process is None or process.poll() is not None:
+            return
+        self.logger.info(f"Terminating server process: {server_name}")
+        try:
+            if os.name == "nt":
+                process.send_signal(signal.CTRL_C_EVENT)
+            else:
+                process.send_signal(signal.SIGTERM)
+            await asyncio.to_thread(process.wait, 5)
+        except subprocess.TimeoutExpired:
+            self.logger.warning(f"Force killing server process: {server_name}")
+            process.kill()
+
+    async def reap_idle_servers(self) -> None:
+        """Shut down the servers which haven't been called for their idle period."""
+        while True:
+            await asyncio.sleep(IDLE_CHECK_INTERVAL)
+            now = time.monotonic()
+            for server_name, server in list(self.servers.items()):
+                if not isinstance(server, MCPServer) or not server.running or server.active_calls:
+                    continue
+                idle_timeout = self.idle_timeout(server.server_config)
+                if idle_timeout and now - server.last_used >= idle_timeout:
+                    self.logger.info(f"Server {server_name} was idle for {idle_timeout}s - shutting it down")
+                    await self.stop_server_instance(server_name)
+
+    def run_in_background(self, coroutine) -> None:
+        """Run a task owned by the server, it's cancelled on cleanup."""
+        task = asyncio.create_task(coroutine)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+
+    async def add_server(
+        self, server_name: str, server_config: Dict[str, Any], initialization_errors: List[Exception]
+    ) -> List[Dict[str, Any]]:
+        """
+        Start a configured server (or offer the cached tools of a lazy one), failures are stored in its place
+        :param server_name: Name of the server in mcp_config.json
+        :param server_config: The configuration of the server
+        :param initialization_errors: Collects the error if the server fails to start
+        :return: The tools of the server
+        """
+        if server_config.get("lazy"):
+            # Offer the cached tools right away, the server itself is started on the first call
+            server = self.cached_server(server_name, server_config)
+            if server is None:
+                self.logger.info(f"No cached tools for lazy server {server_name}, discovering them")
+                server = MCPServer(server_name, server_config)
+                self.run_in_background(self.discover_tools(server_name))
+            self.servers[server_name] = server
+            return [self.tool_to_dict(tool) for tool in server.tools.values()]
+
+        self.logger.info(f"Initializing server: {server_name}")
+        try:
+            server = await self.launch_server(server_name, server_config)
+            self.servers[server_name] = server
+            self.logger.info(f"Server {server_name} initialized successfully")
+            return [self.tool_to_dict(tool) for tool in server.tools.values()]
+        except asyncio.TimeoutError:
+            error = ServerInitError(
+                f"Server initialization timed out after {self.initialization_timeout} seconds", server_name
+            )
+            self.servers[server_name] = error  # Store the error
+            initialization_errors.append(error)
+            self.logger.warning(f"TimeoutError initializing server {server_name}")
+            return []
+        except Exception as e:
+            self.logger.error(f"Exception caught in add_server for {server_name}: {e}")
+
+            # Try to get more details from specific exception types
+            if isinstance(e, CommandNotFoundError):
+                error_details = e.to_dict()
+                self.logger.error(f"CommandNotFoundError details: {error_details}")
+            elif isinstance(e, ServerInitError):
+                error_details = e.to_dict()
+                self.logger.error(f"ServerInitError details: {error_details}")
+            else:
+                error_details = {
+                    "error_type": type(e).__name__,
+                    "message": str(e),
+                }
+                self.logger.error(f"Other exception details: {error_details}")
+
+            error = ServerInitError(f"Server initialization failed: {e}", server_name)
+            error.details = error_details
+            self.servers[server_name] = error  # Store the error
+            initialization_errors.append(error)
+            return []
+
     async def initialize_tools(self) -> Tuple[List[Dict[str, Any]], List[Exception]]:
         """Initialize all MCP tools asynchronously with timeout."""
         config = {}
@@ -282,6 +579,7 @@ class MCPTCPServer:
         initialization_errors = []
 
         try:
+            self.loaded_config_signature = self.config_signature()
             config = self.load_config()
         except ConfigError as e:
             initialization_errors.append(e)
@@ -292,152 +590,294 @@ class MCPTCPServer:
             await self.cleanup()
             return [], initialization_errors
 
-        async def init_with_timeout(server_name: str, server_config: Dict[str, Any]):
-            self.logger.info(f"Initializing server: {server_name}")
-            try:
-                server = await asyncio.wait_for(
-                    self.init_server(server_name, server_config), timeout=self.initialization_timeout
-                )
-                self.servers[server_name] = server
-                self.logger.info(f"Server {server_name} initialized successfully")
-                return [self.tool_to_dict(tool) for tool in server.tools.values()]
-            except asyncio.TimeoutError:
-                error = ServerInitError(
-                    f"Server initialization timed out after {self.initialization_timeout} seconds", server_name
-                )
-                self.servers[server_name] = error  # Store the error
-                initialization_errors.append(error)
-                self.logger.warning(f"TimeoutError initializing server {server_name}")
-                return []
-            except Exception as e:
-                self.logger.error(f"Exception caught in init_with_timeout for {server_name}: {e}")
-
-                # Try to get more details from specific exception types
-                if isinstance(e, CommandNotFoundError):
-                    error_details = e.to_dict()
-                    self.logger.error(f"CommandNotFoundError details: {error_details}")
-                elif isinstance(e, ServerInitError):
-                    error_details = e.to_dict()
-                    self.logger.error(f"ServerInitError details: {error_details}")
-                else:
-                    error_details = {
-                        "error_type": type(e).__name__,
-                        "message": str(e),
-                    }
-                    self.logger.error(f"Other exception details: {error_details}")
+        self.server_configs = config
+        self.load_tools_cache()
 
-                error = ServerInitError(f"Server initialization failed: {e}", server_name)
-                error.details = error_details
-                self.servers[server_name] = error  # Store the error
-                initialization_errors.append(error)
-                return []
-
-        tasks = [init_with_timeout(name, config) for name, config in config.items()]
+        tasks = [self.add_server(name, config, initialization_errors) for name, config in config.items()]
         results = await asyncio.gather(*tasks, return_exceptions=True)
 
         # Flatten the results list and filter out empty lists and exceptions
         all_tools = [tool for sublist in results if isinstance(sublist, list) for tool in sublist]
+        self.save_tools_cache()
 
         return all_tools, initialization_errors
 
-    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
-        """Handle individual TCP client connections."""
+    @staticmethod
+    def config_signature() -> Optional[Tuple[int, int]]:
+        """Modification time and size of mcp_config.json, None if it's missing."""
         try:
-            while True:
-                length_bytes = await reader.read(4)
-                if not length_bytes:
-                    break
+            stat = os.stat(MCP_PATH)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
 
-                msg_length = int.from_bytes(length_bytes, "big")
-                data = await reader.read(msg_length)
-                if not data:
-                    break
+    async def reload_config(self) -> None:
+        """
+        Apply the changes of mcp_config.json to the running servers.
+        Added servers are started, removed ones stopped and only the ones whose launch settings changed
+        are restarted. Calls to a restarting server wait for its replacement.
+        """
+        config = self.load_config()
+        old_config = self.server_configs
+        removed = [name for name in old_config if name not in config]
+        added = [name for name in config if name not in old_config]
+        changed = [
+            name
+            for name in config
+            if name in old_config and self.config_fingerprint(config[name]) != self.config_fingerprint(old_config[name])
+        ]
 
-                request = json.loads(data.decode())
-                command = request.get("command")
-                response = {"status": "error", "error": MCPError("INVALID_COMMAND", "Invalid command").to_dict()}
+        # Lazy start and idle timeout changes apply without a restart
+        for server_name, server in self.servers.items():
+            if isinstance(server, MCPServer) and server_name in config:
+                server.server_config = config[server_name]
 
-                try:
-                    if command == "call_tool":
-                        tool_name = request["tool_name"]
-                        arguments = request["arguments"]
-
-                        # Find server for tool
-                        server = next(
-                            (s for s in self.servers.values() if isinstance(s, MCPServer) and tool_name in s.tools),
-                            None,
-                        )
-
-                        # Check if server failed to initialize
-                        failed_server = next(
-                            (
-                                s
-                                for s in self.servers.values()
-                                if isinstance(s, Exception) and not isinstance(s, MCPServer) and s == server
-                            ),
-                            None,
-                        )
-
-                        if failed_server:
-                            # Return the initialization error
-                            if isinstance(failed_server, CommandNotFoundError):
-                                response = {"status": "error", "error": failed_server.to_dict()}
-                            else:
-                                response = {
-                                    "status": "error",
-                                    "error": MCPError("SERVER_ERROR", "Server initialization failed").to_dict(),
-                                }
-
-                        elif not server:
-                            raise ToolExecutionError(f"Tool not found", tool_name, arguments)
-
-                        else:
-                            result = await server.session.call_tool(tool_name, arguments)
-                            response = {"status": "success", "result": str(result)}
-
-                    elif command == "get_tools":
-                        tools = []
-                        initialization_errors = []
-                        for server_name, server in self.servers.items():
-                            if isinstance(server, MCPServer):
-                                tools.extend(self.tool_to_dict(tool) for tool in server.tools.values())
-                            elif isinstance(server, Exception):
-                                initialization_errors.append(
-                                    {
-                                        "server": server_name,
-                                        "error": server.to_dict() if hasattr(server, "to_dict") else str(server),
-                                    }
-                                )
+        self.server_configs = config
+        if not (removed or added or changed):
+            return
+        self.logger.info(
+            f"Reloading mcp_config.json - added: {added or 'none'}, removed: {removed or 'none'}, "
+            f"changed: {changed or 'none'}"
+        )
+
+        initialization_errors = []
+
+        async def apply(server_name: str):
+            async with self.start_locks.setdefault(server_name, asyncio.Lock()):
+                if server_name in old_config:
+                    await self.stop_server_instance(server_name)
+                    if server_name not in config:
+                        self.servers.pop(server_name, None)
+                    elif not isinstance(self.servers.get(server_name), MCPServer):
+                        # The stopped entry stays until its replacement is stored, so calls in between go through
+                        # ensure_running() and wait on this lock instead of finding no server
+                        self.servers[server_name] = MCPServer(server_name, config[server_name])
+                if server_name in config:
+                    await self.add_server(server_name, config[server_name], initialization_errors)
+
+        await asyncio.gather(*(apply(server_name) for server_name in removed + added + changed))
+        for error in initialization_errors:
+            self.logger.warning(f"  - {error}")
+        self.save_tools_cache()
+        self.rebuild_catalog()
+
+    async def watch_config(self) -> None:
+        """Reload mcp_config.json whenever it changes, an invalid file keeps the current servers."""
+        while True:
+            await asyncio.sleep(CONFIG_CHECK_INTERVAL)
+            signature = self.config_signature()
+            if signature == self.loaded_config_signature:
+                continue
+            self.loaded_config_signature = signature
+            try:
+                await self.reload_config()
+            except ConfigError as e:
+                self.logger.error(f"Ignoring the changes of mcp_config.json: {e}")
+
+    @staticmethod
+    def namespaced(server_name: str, tool_name: str) -> str:
+        """Unique tool name, restricted to the characters every provider accepts in function names."""
+        return re.sub(r"[^A-Za-z0-9_-]", "_", server_name) + NAMESPACE_SEPARATOR + tool_name
+
+    def rebuild_routes(self) -> None:
+        """
+        Rebuild the index from the exposed tool name to its owning server and its original name.
+        Tool names offered by more than one server are namespaced as `<server>__<tool>` for every owner.
+        """
+        owners: Dict[str, List[str]] = {}
+        for server_name, server in self.servers.items():
+            if isinstance(server, MCPServer):
+                for tool_name in server.tools:
+                    owners.setdefault(tool_name, []).append(server_name)
+
+        routes = {}
+        for tool_name, server_names in owners.items():
+            if len(server_names) == 1:
+                routes[tool_name] = (server_names[0], tool_name)
+                continue
+            self.logger.warning(f"Tool '{tool_name}' is provided by {', '.join(server_names)} - namespacing it")
+            for server_name in server_names:
+                routes[self.namespaced(server_name, tool_name)] = (server_name, tool_name)
+        self.tool_routes = routes
+
+    def resolve_tool(self, tool_name: str) -> Optional[Tuple[str, str]]:
+        """
+        Find the server owning a tool
+        :param tool_name: Exposed tool name, `<server>.<tool>` addresses a server explicitly
+        :return: (server name, original tool name) or None if there's no such tool
+        """
+        if route := self.tool_routes.get(tool_name):
+            return route
+        server_name, _, real_name = tool_name.partition(".")
+        server = self.servers.get(server_name)
+        if real_name and isinstance(server, MCPServer) and real_name in server.tools:
+            return server_name, real_name
+        return None
+
+    def rebuild_catalog(self) -> None:
+        """Serialise the tools of all servers once and bump the catalog version if anything changed."""
+        self.rebuild_routes()
+        tools = []
+        tool_servers = {}
+        initialization_errors = []
+        for tool_name, (server_name, real_name) in self.tool_routes.items():
+            tools.append({**self.tool_to_dict(self.servers[server_name].tools[real_name]), "name": tool_name})
+            tool_servers[tool_name] = server_name
+        for server_name, server in self.servers.items():
+            if isinstance(server, Exception):
+                initialization_errors.append(
+                    {
+                        "server": server_name,
+                        "error": server.to_dict() if hasattr(server, "to_dict") else str(server),
+                    }
+                )
+
+        catalog = {
+            "tools": tools,
+            "tool_servers": tool_servers,
+            "initialization_errors": initialization_errors if initialization_errors else None,
+        }
+        etag = hashlib.sha256(json.dumps(catalog, sort_keys=True, default=str).encode()).hexdigest()
+        if etag != self.catalog_etag:
+            self.catalog = catalog
+            self.catalog_etag = etag
+            self.catalog_version += 1
+            self.logger.info(f"Tool catalog updated to version {self.catalog_version} ({len(tools)} tools)")
+
+    async def process_request(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute a single client request and build its response."""
+        command = request.get("command")
+        response = {"status": "error", "error": MCPError("INVALID_COMMAND", "Invalid command").to_dict()}
+
+        try:
+            if command == "hello":
+                response = {"status": "success", "protocol": min(request.get("protocol", 1), PROTOCOL_VERSION)}
+
+            elif command == "ping":
+                response = {"status": "success", "result": "pong"}
+
+            elif command == "call_tool":
+                tool_name = request["tool_name"]
+                arguments = request["arguments"]
+
+                # Find server for tool
+                route = self.resolve_tool(tool_name)
+                server = self.servers.get(route[0]) if route else None
+
+                # Check if server failed to initialize
+                failed_server = server if isinstance(server, Exception) else None
 
+                if failed_server:
+                    # Return the initialization error
+                    if isinstance(failed_server, CommandNotFoundError):
+                        response = {"status": "error", "error": failed_server.to_dict()}
+                    else:
                         response = {
-                            "status": "success",
-                            "tools": tools,
-                            "initialization_errors": initialization_errors if initialization_errors else None,
+                            "status": "error",
+                            "error": MCPError("SERVER_ERROR", "Server initialization failed").to_dict(),
                         }
 
-                except Exception as e:
-                    if isinstance(e, (ConfigError, ServerInitError, ToolExecutionError, CommandNotFoundError)):
-                        response = {"status": "error", "error": e.to_dict()}
-                    else:
-                        response = {"status": "error", "error": MCPError("UNKNOWN_ERROR", str(e)).to_dict()}
+                elif not server:
+                    raise ToolExecutionError(f"Tool not found", tool_name, arguments)
+
+                else:
+                    if not server.running:
+                        server = await self.ensure_running(route[0])
+                    server.active_calls += 1
+                    try:
+                        result = await server.session.call_tool(route[1], arguments)
+                    finally:
+                        server.active_calls -= 1
+                        server.last_used = time.monotonic()
+                    response = {"status": "success", "result": str(result)}
+
+            elif command == "get_tools":
+                # Clients holding the current catalog only get a confirmation instead of every tool schema
+                if request.get("if_none_match") == self.catalog_etag:
+                    response = {"status": "not_modified"}
+                else:
+                    response = {"status": "success", **self.catalog}
+                response.update(etag=self.catalog_etag, version=self.catalog_version)
 
-                # Ensure response is sent and connection is drained
-                response_data = json.dumps(response).encode()
+        except Exception as e:
+            if isinstance(e, (ConfigError, ServerInitError, ToolExecutionError, CommandNotFoundError)):
+                response = {"status": "error", "error": e.to_dict()}
+            else:
+                response = {"status": "error", "error": MCPError("UNKNOWN_ERROR", str(e)).to_dict()}
+
+        return response
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Handle individual TCP client connections.
+        Every request is processed in its own task, so pipelined calls run concurrently.
+        Protocol 1 clients get the responses back in the order of their requests, while protocol 2
+        clients (after the "hello" handshake) get each response as soon as it's ready, tagged with the request id.
+        """
+        write_lock = asyncio.Lock()
+        ordered: asyncio.Queue = asyncio.Queue()
+        in_flight = set()
+        multiplexed = False
+
+        async def write_response(response: Dict[str, Any]):
+            response_data = json.dumps(response).encode()
+            async with write_lock:
                 writer.write(len(response_data).to_bytes(4, "big"))
                 writer.write(response_data)
                 await writer.drain()  # Make sure data is sent before continuing
 
+        async def write_ordered_responses():
+            while (task := await ordered.get()) is not None:
+                await write_response(await task)
+
+        async def respond_when_done(request: Dict[str, Any]):
+            response = await self.process_request(request)
+            response["id"] = request.get("id")
+            await write_response(response)
+
+        writer_task = asyncio.create_task(write_ordered_responses())
+        try:
+            while True:
+                # Connections are pooled and reused by the client, so frames must be read exactly
+                try:
+                    length_bytes = await reader.readexactly(4)
+                    msg_length = int.from_bytes(length_bytes, "big")
+                    data = await reader.readexactly(msg_length)
+                except asyncio.IncompleteReadError:
+                    break
+
+                request = json.loads(data.decode())
+                if request.get("command") == "hello":
+                    multiplexed = request.get("protocol", 1) >= 2
+
+                if multiplexed:
+                    task = asyncio.create_task(respond_when_done(request))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+                else:
+                    await ordered.put(asyncio.create_task(self.process_request(request)))
+
+            # Flush the responses of the requests which are still in-flight
+            await ordered.put(None)
+            await writer_task
+            await asyncio.gather(*in_flight, return_exceptions=True)
+
         except Exception as e:
             self.logger.error(f"Error handling client: {e}")
         finally:
+            if not writer_task.done():
+                writer_task.cancel()
             writer.close()
             await writer.wait_closed()
 
     async def cleanup(self):
         """Cleanup all MCP sessions and connections."""
+        for task in list(self.background_tasks):
+            task.cancel()
+
         cleanup_tasks = [
-            asyncio.wait_for(server.cleanup(), timeout=5)
-            for server in self.servers.values()
+            self.stop_server_instance(server_name)
+            for server_name, server in self.servers.items()
             if isinstance(server, MCPServer)
         ]
         results = await asyncio.gather(*cleanup_tasks, return_exceptions=True)
@@ -448,26 +888,21 @@ class MCPTCPServer:
         self.servers.clear()
 
         # Terminate server processes
-        for server_name, process in self.server_processes.items():
-            if process.poll() is None:  # Check if process is still running
-                self.logger.info(f"Terminating server process: {server_name}")
-                try:
-                    if os.name == "nt":
-                        process.send_signal(signal.CTRL_C_EVENT)
-                    else:
-                        process.send_signal(signal.SIGTERM)
+        for server_name in list(self.server_processes):
+            await self.terminate_process(server_name)
 
-                    process.wait(timeout=5)  # Wait for process to terminate
-                except subprocess.TimeoutExpired:
-                    self.logger.warning(f"Force killing server process: {server_name}")
-                    process.kill()
-        self.server_processes.clear()
+    def announce_ready(self) -> None:
+        """Record the pid and tell the server manager that the listener accepts connections."""
+        with open(self.pid_path, "w") as f:
+            f.write(str(os.getpid()))
+        print(READY_LINE, flush=True)
 
     async def start(self):
         """Start the TCP server and initialize MCP tools."""
         try:
             # Initialize MCP tools first
             tools, errors = await self.initialize_tools()
+            self.rebuild_catalog()
 
             # Check if config load failed and prevent server start
             config_error = next((e for e in errors if isinstance(e, ConfigError)), None)
@@ -476,7 +911,18 @@ class MCPTCPServer:
                 exit(1)
 
             # Start TCP server even if some tools failed to initialize
-            server = await asyncio.start_server(self.handle_client, self.host, self.port)
+            if self.socket_path:
+                # A killed server leaves its socket file behind, which would make the bind fail
+                if os.path.exists(self.socket_path):
+                    os.remove(self.socket_path)
+                server = await asyncio.start_unix_server(self.handle_client, path=self.socket_path)
+                os.chmod(self.socket_path, 0o600)  # Only the owner may call the tools
+                address = self.socket_path
+            else:
+                server = await asyncio.start_server(self.handle_client, self.host, self.port)
+                address = f"{self.host}:{self.port}"
+            self.run_in_background(self.reap_idle_servers())
+            self.run_in_background(self.watch_config())
 
             # Print information about successful tool initialization
             if tools:
@@ -492,7 +938,8 @@ class MCPTCPServer:
                         self.logger.warning(f"  - {error}")
 
             async with server:
-                self.logger.info(f"Server running on {self.host}:{self.port}")
+                self.logger.info(f"Server running on {address}")
+                self.announce_ready()
                 await server.serve_forever()
 
         except Exception as e:
@@ -502,13 +949,32 @@ class MCPTCPServer:
 
 
 if __name__ == "__main__":
-    server = MCPTCPServer()
+    parser = argparse.ArgumentParser(description="Expose the tools of the configured MCP servers over one socket")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix-socket", help="Listen on this unix domain socket instead of TCP")
+    parser.add_argument("--pid-file", default=PID_PATH, help="Where to record the pid once the server listens")
+    parser.add_argument("--log-file", default=LOG_PATH, help="Where to write the DEBUG log")
+    parser.add_argument("--tools-cache", default=TOOLS_CACHE_PATH, help="Where to keep the tool lists of the servers")
+    cli_args = parser.parse_args()
+    if cli_args.log_file != LOG_PATH:
+        logger.removeHandler(file_handler)
+        logger.addHandler(file_log_handler(cli_args.log_file))
+    create_config_if_missing()
+    server = MCPTCPServer(cli_args.host, cli_args.port, cli_args.unix_socket, cli_args.pid_file, cli_args.tools_cache)
 
     async def main():
+        if os.name != "nt":
+            # The server manager stops the server with SIGTERM, shut the MCP servers down gracefully
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
         try:
             await server.start()
-        except KeyboardInterrupt:
+        except (KeyboardInterrupt, asyncio.CancelledError):
             logger.info("\nShutting down server...")
             await server.cleanup()
+        finally:
+            for path in (server.pid_path, server.socket_path):
+                if path and os.path.exists(path):
+                    os.remove(path)
 
     asyncio.run(main())
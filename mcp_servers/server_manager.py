@@ -3,24 +3,57 @@ import signal
 import socket
 import subprocess
 import sys
-import time
+import threading
 from typing import Optional, Tuple
 
 import psutil
 
+from console_gpt.config_manager import fetch_variable
 from console_gpt.custom_stdout import custom_print
 
+# Must match mcp_tcp_server.py
+READY_LINE = "MCP server ready"
+PID_FILE = os.path.join(os.path.dirname(__file__), "mcp_tcp_server.pid")
+SOCKET_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mcp_tcp_server.sock")
+MAX_SOCKET_PATH = 100  # sun_path holds 104-108 bytes depending on the OS
+
+STARTUP_TIMEOUT = 60
+SHUTDOWN_TIMEOUT = 5
+
+
+def unix_socket_path() -> Optional[str]:
+    """
+    Pick the transport of the client/server link from `transport` in config.toml
+    "auto" uses a unix domain socket on Linux and TCP anywhere else
+    :return: The socket path or None if the link goes over TCP
+    """
+    transport = fetch_variable("mcp", "transport", default="auto")
+    if transport == "tcp" or not hasattr(socket, "AF_UNIX"):
+        return None
+    if transport == "auto" and not sys.platform.startswith("linux"):
+        return None
+    if len(SOCKET_FILE.encode()) > MAX_SOCKET_PATH:
+        custom_print("warn", "The install path is too long for a unix socket, using TCP instead")
+        return None
+    return SOCKET_FILE
+
 
 class ServerManager:
     def __init__(self, host: str = "localhost", port: int = 8765):
         self.host = host
         self.port = port
+        self.socket_path = unix_socket_path()
         self.server_process: Optional[subprocess.Popen] = None
         self.server_script = os.path.join(os.path.dirname(__file__), "mcp_tcp_server.py")
 
     def is_port_open(self) -> bool:
-        """Check if the server port is open."""
+        """Check if the server port (or unix socket) is open."""
         try:
+            if self.socket_path:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                    sock.settimeout(1)
+                    sock.connect(self.socket_path)
+                    return True
             with socket.create_connection((self.host, self.port), timeout=1):
                 return True
         except (ConnectionRefusedError, socket.timeout, OSError) as e:
@@ -34,22 +67,43 @@ class ServerManager:
         """Check if the server is fully running by checking both process and port."""
         return self.is_process_running() and self.is_port_open()
 
+    @staticmethod
+    def read_pid_file() -> Optional[int]:
+        """Read the pid the server recorded once it started listening."""
+        try:
+            with open(PID_FILE, "r") as f:
+                return int(f.read().strip())
+        except (OSError, ValueError):
+            return None
+
     def find_server_process(self) -> Optional[psutil.Process]:
         """Find the server process if it's running"""
         if self.server_process and self.server_process.poll() is None:
-            return self.server_process
-
-        server_name = os.path.basename(self.server_script)
-        for proc in psutil.process_iter(["pid", "name", "cmdline"]):
-            try:
-                if proc.info["cmdline"]:
-                    cmdline = " ".join(proc.info["cmdline"])
-                    if server_name in cmdline and "python" in cmdline.lower():
-                        return proc
-            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                pass
+            pid = self.server_process.pid
+        elif (pid := self.read_pid_file()) is None:
+            return None
+
+        try:
+            proc = psutil.Process(pid)
+            # The pid may have been reused after the server died without removing its pidfile
+            if os.path.basename(self.server_script) in " ".join(proc.cmdline()):
+                return proc
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            pass
         return None
 
+    @staticmethod
+    def _watch_output(process: subprocess.Popen, ready: threading.Event) -> None:
+        """
+        Drain the server output (a full pipe would block its logging) and flag when it's ready.
+        The event is also set when the process exits, so the caller never waits for a dead server.
+        """
+        for line in process.stdout:
+            if line.strip() == READY_LINE:
+                ready.set()
+        process.wait()
+        ready.set()
+
     def start_server(self) -> Tuple[bool, str]:
         """Start the server if it's not already running."""
         if self.is_server_running():
@@ -57,34 +111,37 @@ class ServerManager:
 
         try:
             custom_print("info", "Starting MCP server...")
+            command = [sys.executable, self.server_script]
+            if self.socket_path:
+                command += ["--unix-socket", self.socket_path]
 
             # Start the server as a subprocess
             if os.name == "nt":  # Windows
                 self.server_process = subprocess.Popen(
-                    [sys.executable, self.server_script],
+                    command,
                     stdout=subprocess.PIPE,
+                    text=True,
                     creationflags=subprocess.CREATE_NEW_PROCESS_GROUP,
                 )
             else:  # Unix-like systems
                 self.server_process = subprocess.Popen(
-                    [sys.executable, self.server_script],
+                    command,
                     stdout=subprocess.PIPE,
+                    text=True,
                     start_new_session=True,
                 )
 
-            start_time = time.time()
-            while time.time() - start_time < 60:
-                time.sleep(0.5)
-                # Check if process has exited
-                if self.server_process.poll() is not None:
-                    # Process has exited
-                    if self.server_process.returncode != 0:
-                        return False, "Server failed to start: Pelase check your mcp_config.json file"
-                if self.is_port_open():
-                    custom_print("info", "Server is accepting connections.")
-                    return True, "Server process started successfully"
+            ready = threading.Event()
+            threading.Thread(
+                target=self._watch_output, args=(self.server_process, ready), name="mcp-server-output", daemon=True
+            ).start()
 
-            return False, "Server failed to start: Port did not open within timeout"
+            if not ready.wait(STARTUP_TIMEOUT):
+                return False, "Server failed to start: Port did not open within timeout"
+            if self.server_process.poll() is not None:
+                return False, "Server failed to start: Pelase check your mcp_config.json file"
+            custom_print("info", "Server is accepting connections.")
+            return True, "Server process started successfully"
 
         except Exception as e:
             if self.server_process:
@@ -110,13 +167,14 @@ class ServerManager:
                 else:  # Unix-like systems
                     server_proc.send_signal(signal.SIGTERM)
 
-                # Wait for the process to terminate (max 5 seconds)
-                for _ in range(10):
-                    if not self.is_server_running():
-                        self.server_process = None
-                        custom_print("info", "Server stopped successfully")
-                        return True, "Server stopped successfully"
-                    time.sleep(0.5)
+                # Wait for the process to terminate
+                try:
+                    server_proc.wait(timeout=SHUTDOWN_TIMEOUT)
+                    self.server_process = None
+                    custom_print("info", "Server stopped successfully")
+                    return True, "Server stopped successfully"
+                except psutil.TimeoutExpired:
+                    pass
 
                 # If server still running, force kill
                 custom_print("warn", "Server didn't stop gracefully, forcing shutdown...")
@@ -126,12 +184,14 @@ class ServerManager:
                     server_proc.send_signal(signal.SIGKILL)
 
                 self.server_process = None
-                for _ in range(10):
-                    if not self.is_port_open():
-                        break
-                    time.sleep(0.5)
-                else:
-                    return False, "Failed to stop server: Port still in use"
+                try:
+                    server_proc.wait(timeout=SHUTDOWN_TIMEOUT)
+                except psutil.TimeoutExpired:
+                    return False, "Failed to stop server: Process did not exit"
+                finally:
+                    # A killed server can't remove its pidfile
+                    if os.path.exists(PID_FILE):
+                        os.remove(PID_FILE)
 
                 return True, "Server force stopped"
             else: